@@ -0,0 +1,153 @@
+'''
+Seeded synthetic content for benchmarks and query-count tests.
+
+generate() fills an empty database (with only the migrations' home page)
+with a blog, its tag listing, posts, categories, images and a projects
+section. The same seed and counts always produce the same content.
+'''
+
+import datetime
+import io
+import json
+import random
+
+from django.core.files.images import ImageFile
+from django.core.management import call_command
+from PIL import Image as PILImage
+
+from wagtail.core.models import Site
+from wagtail.images import get_image_model
+from wagtailmenus.models import MainMenu
+
+from blog.models import BlogCategory, BlogIndexPage, BlogPage, BlogTagIndexPage
+from home.models import HomePage, HomePageGalleryImage, SocialMediaLink
+from projects.models import ProjectIndexPage, ProjectPage
+
+WORDS = tuple((
+    'wagtail django python page cache query index render template image '
+    'search tag post project garden river mountain coffee bicycle winter '
+    'summer harbour lantern orbit pixel signal thread kernel schema vector'
+).split())
+
+
+class Content:
+    '''
+    The generated pages, for building scenario URLs and test assertions.
+    '''
+    words = WORDS
+
+    def __init__(self):
+        self.home = None
+        self.blog = None
+        self.tag_index = None
+        self.projects = None
+        self.posts = []
+        self.project_pages = []
+        self.tags = []
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def make_image(rng, index):
+    colour = tuple(rng.randrange(256) for _ in range(3))
+    picture = PILImage.new('RGB', (1200, 800), colour)
+    data = io.BytesIO()
+    picture.save(data, 'JPEG', quality=85)
+    return get_image_model().objects.create(
+        title='Image %d' % index,
+        file=ImageFile(data, name='benchmark-%d.jpg' % index),
+    )
+
+
+def make_body(rng, images, blocks):
+    body = []
+    for index in range(blocks):
+        kind = ('heading', 'paragraph', 'paragraph', 'image')[index % 4]
+        if kind == 'heading':
+            value = sentence(rng, 4)
+        elif kind == 'paragraph':
+            value = '<p>%s</p>' % ' '.join(sentence(rng) for _ in range(3))
+        else:
+            value = rng.choice(images).pk
+        body.append({'type': kind, 'value': value})
+    return json.dumps(body)
+
+
+def generate(seed=0, posts=50, tags=10, categories=4, images=8, blocks=8,
+             projects=10, tags_per_post=3):
+    '''
+    Builds the content tree under the site's home page and returns a Content
+    describing it. Pages are published through revisions, as editors would.
+    '''
+    rng = random.Random(seed)
+    content = Content()
+    start = datetime.date(2020, 1, 1)
+
+    image_objects = [make_image(rng, index) for index in range(max(images, 1))]
+    category_objects = [
+        BlogCategory.objects.create(
+            name='Category %d' % index, icon=rng.choice(image_objects)
+        )
+        for index in range(categories)
+    ]
+    content.tags = ['%s-%d' % (rng.choice(WORDS), index) for index in range(tags)]
+
+    home = HomePage.objects.get(depth=2)
+    home.name = 'Benchmark'
+    home.intro = '<p>%s</p>' % sentence(rng)
+    for image in image_objects[:3]:
+        home.gallery_images.add(HomePageGalleryImage(image=image))
+    for index in range(3):
+        link = SocialMediaLink.objects.create(
+            name='Link %d' % index, link_url='https://example.com/%d' % index,
+            icon=rng.choice(image_objects),
+        )
+        home.social_links.add(link)
+    home.save_revision().publish()
+    content.home = home
+    # Created by the first request otherwise, as on a new site
+    MainMenu.get_for_site(Site.objects.get(root_page=home))
+
+    blog = home.add_child(instance=BlogIndexPage(
+        title='Blog', slug='blog', intro='<p>%s</p>' % sentence(rng)
+    ))
+    content.blog = blog
+    content.tag_index = blog.add_child(
+        instance=BlogTagIndexPage(title='Tags', slug='tags')
+    )
+
+    for index in range(posts):
+        post = blog.add_child(instance=BlogPage(
+            title=sentence(rng, 4).rstrip('.'),
+            slug='post-%d' % index,
+            date=start + datetime.timedelta(days=index),
+            body=make_body(rng, image_objects, blocks),
+        ))
+        if content.tags:
+            post.tags.add(*rng.sample(content.tags, min(tags_per_post, len(content.tags))))
+        if category_objects:
+            post.categories.add(rng.choice(category_objects))
+        post.save_revision().publish()
+        content.posts.append(post)
+
+    projects_index = home.add_child(instance=ProjectIndexPage(
+        title='Projects', slug='projects', intro='<p>%s</p>' % sentence(rng)
+    ))
+    content.projects = projects_index
+    for index in range(projects):
+        project = projects_index.add_child(instance=ProjectPage(
+            title=sentence(rng, 3).rstrip('.'),
+            slug='project-%d' % index,
+            date=start + datetime.timedelta(days=index),
+            intro=sentence(rng),
+            body=make_body(rng, image_objects, blocks),
+        ))
+        project.save_revision().publish()
+        content.project_pages.append(project)
+
+    # Build the search index, as a deployment would after migrating
+    call_command('reindex_pages', stdout=io.StringIO())
+
+    return content
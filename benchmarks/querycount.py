@@ -0,0 +1,129 @@
+'''
+Test case base class for asserting that pages make a constant number of
+queries however much content there is.
+
+Each check renders a benchmark scenario against generated content at two
+sizes and compares the query counts, both with every cache cleared and
+with only the full-page cache bypassed. When they differ, the failure lists
+the statements that were repeated more often for the larger size. Both
+requests must also stay within settings.QUERY_BUDGETS.
+'''
+
+import logging
+import re
+import shutil
+import tempfile
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from wagtail.images import get_image_model
+
+from home.renditions import generate_renditions
+from mysite.cache import bump_version
+from mysite.instrumentation import QueryBudgetExceeded
+
+from .content import generate
+from .scenarios import get_scenarios
+
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r'IN \((?:\?, )*\?\)')
+SAVEPOINT_RE = re.compile(r'"s\d+_x\d+"')
+
+
+def normalise_sql(sql):
+    sql = LITERAL_RE.sub('?', SAVEPOINT_RE.sub('?', sql))
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+def get_repeated_queries(small, large):
+    '''
+    Returns (sql, extra) pairs for the normalised statements run more often
+    in large than in small, most repeated first.
+    '''
+    extra = Counter(map(normalise_sql, large))
+    extra.subtract(Counter(map(normalise_sql, small)))
+    return [(sql, count) for sql, count in extra.most_common() if count > 0]
+
+
+class QueryCountTestCase(TestCase):
+    # Fewer posts than a listing page holds, and several listing pages' worth
+    sizes = (2, 12)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        media_root = tempfile.mkdtemp(prefix='querycount-media-')
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(
+            MEDIA_ROOT=media_root,
+            RENDITION_WORKERS=0,
+            QUERY_BUDGET_STRICT=True,
+            # Tests run without collectstatic's manifest
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+        )
+        settings.enable()
+        cls.addClassCleanup(settings.disable)
+
+        # Budget overruns raise instead; the per-request log is just noise
+        logger = logging.getLogger('mysite.performance')
+        cls.addClassCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.ERROR)
+
+    def capture_queries(self, scenario, size):
+        '''
+        Returns get()'s result for a cold and a warm request for the scenario
+        with size posts and projects. The content is rolled back afterwards.
+        '''
+        with transaction.atomic():
+            content = generate(
+                posts=size, projects=size, tags=6, categories=3, images=3,
+                blocks=4,
+            )
+            # Done on commit after publishing, which never happens here
+            generate_renditions(
+                get_image_model().objects.values_list('pk', flat=True)
+            )
+            url = dict(get_scenarios(content))[scenario]
+
+            cache.clear()
+            cold = self.get(url)
+            bump_version('pages')
+            warm = self.get(url)
+
+            transaction.set_rollback(True)
+        return cold, warm
+
+    def get(self, url):
+        '''
+        Requests url and returns the SQL it ran, and the message if it went
+        over its query budget.
+        '''
+        over_budget = None
+        with CaptureQueriesContext(connection) as queries:
+            try:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200, url)
+            except QueryBudgetExceeded as e:
+                # Reported after the counts have been compared
+                over_budget = str(e)
+        return [query['sql'] for query in queries], over_budget
+
+    def assertConstantQueries(self, scenario):
+        small, large = [
+            self.capture_queries(scenario, size) for size in self.sizes
+        ]
+        for label, (small_sql, _), (large_sql, _) in zip(('cold', 'warm'), small, large):
+            if len(small_sql) == len(large_sql):
+                continue
+            repeated = get_repeated_queries(small_sql, large_sql)
+            self.fail('%s (%s) made %d queries with %d posts and %d with %d:\n%s' % (
+                scenario, label, len(small_sql), self.sizes[0],
+                len(large_sql), self.sizes[1],
+                '\n'.join('  +%d  %s' % (count, sql) for sql, count in repeated),
+            ))
+        for _, over_budget in small + large:
+            if over_budget:
+                self.fail(over_budget)
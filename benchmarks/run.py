@@ -0,0 +1,141 @@
+'''
+Runs the benchmark scenarios against a throwaway database filled with
+synthetic content and writes the results as JSON.
+
+    python -m benchmarks.run --posts 200 --output results.json
+    python -m benchmarks.run --posts 200 --compare results.json
+
+With --compare, the run exits with status 1 if any scenario's median time
+grew by more than --threshold or it made more queries than before.
+'''
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new, threshold):
+    '''
+    Returns a list of regression messages between two result files.
+    '''
+    regressions = []
+    for name, result in new['scenarios'].items():
+        previous = old['scenarios'].get(name)
+        if previous is None:
+            continue
+        if result['queries'] > previous['queries']:
+            regressions.append('%s: %d queries, was %d' % (
+                name, result['queries'], previous['queries']
+            ))
+        limit = previous['median_ms'] * (1 + threshold)
+        if result['median_ms'] > limit:
+            regressions.append('%s: median %.1fms, was %.1fms' % (
+                name, result['median_ms'], previous['median_ms']
+            ))
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--posts', type=int, default=100)
+    parser.add_argument('--tags', type=int, default=20)
+    parser.add_argument('--categories', type=int, default=5)
+    parser.add_argument('--images', type=int, default=10)
+    parser.add_argument('--blocks', type=int, default=8)
+    parser.add_argument('--projects', type=int, default=20)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument(
+        '--scenario', action='append', dest='scenarios',
+        help='Only run the named scenario. May be given more than once.',
+    )
+    parser.add_argument('--output', help='Write the results to this file.')
+    parser.add_argument('--compare', help='Results file to compare against.')
+    parser.add_argument(
+        '--threshold', type=float, default=0.2,
+        help='Allowed relative growth of median times (default: 0.2).',
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings.dev')
+    import django
+    django.setup()
+
+    import logging
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment
+    import wagtail
+
+    from benchmarks import content, scenarios
+
+    # Keep budget warnings but not a log line per request
+    logging.getLogger('mysite.performance').setLevel(logging.WARNING)
+
+    media_root = tempfile.mkdtemp(prefix='benchmark-media-')
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with override_settings(MEDIA_ROOT=media_root, RENDITION_WORKERS=0):
+            counts = dict(
+                posts=args.posts, tags=args.tags, categories=args.categories,
+                images=args.images, blocks=args.blocks, projects=args.projects,
+            )
+            generated = content.generate(seed=args.seed, **counts)
+            results = {
+                'commit': get_commit(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'wagtail': wagtail.__version__,
+                'database': connection.vendor,
+                'seed': args.seed,
+                'content': counts,
+                'iterations': args.iterations,
+                'scenarios': scenarios.run_all(
+                    generated, args.iterations, args.scenarios
+                ),
+            }
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(media_root, ignore_errors=True)
+
+    for name, result in results['scenarios'].items():
+        print('%-16s median %7.1fms  p95 %7.1fms  %3d queries (cold %d)' % (
+            name, result['median_ms'], result['p95_ms'], result['queries'],
+            result['cold_queries'],
+        ))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        for message in regressions:
+            print('REGRESSION ' + message, file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
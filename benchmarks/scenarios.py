@@ -0,0 +1,114 @@
+'''
+Benchmark scenarios: the requests whose timings and query counts are
+recorded for every run.
+
+Each scenario is requested once with every cache cleared ("cold") and then
+a number of times with only the full-page cache bypassed ("warm"), which is
+what an anonymous visitor sees on a page cache miss.
+'''
+
+import statistics
+import time
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+
+from mysite.cache import bump_version
+
+
+def get_scenarios(content):
+    '''
+    Returns (name, url) pairs for the generated content.
+    '''
+    blog_url = content.blog.url
+    last_page = max((len(content.posts) + 4) // 5, 1)
+    middle_post = content.posts[len(content.posts) // 2] if content.posts else None
+    scenarios = [
+        ('home', content.home.url),
+        ('blog_index', blog_url),
+        ('blog_index_deep', '%s?page=%d' % (blog_url, last_page)),
+    ]
+    if middle_post:
+        # A tag and a search term that match at least one post at any size
+        tags = sorted(middle_post.tags.names())
+        if tags:
+            scenarios.append(
+                ('blog_tag', '%s?tag=%s' % (content.tag_index.url, tags[0]))
+            )
+        scenarios.append(('blog_post', middle_post.url))
+        query = middle_post.title.split()[0].lower()
+    else:
+        query = content.words[0]
+    scenarios.append(('project_index', content.projects.url))
+    if content.project_pages:
+        scenarios.append(('project', content.project_pages[0].url))
+    scenarios += [
+        ('search', '/search/?query=%s' % query),
+        ('search_deep', '/search/?query=%s&page=2' % query),
+    ]
+    return scenarios
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def request(client, url):
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        started = time.perf_counter()
+        response = client.get(url)
+        duration = (time.perf_counter() - started) * 1000
+    if response.status_code != 200:
+        raise AssertionError('%s returned %d' % (url, response.status_code))
+    return duration, counter.count
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def run_scenario(client, url, iterations):
+    cache.clear()
+    cold_ms, cold_queries = request(client, url)
+
+    durations = []
+    queries = []
+    for _ in range(iterations):
+        bump_version('pages')
+        duration, count = request(client, url)
+        durations.append(duration)
+        queries.append(count)
+
+    return {
+        'url': url,
+        'cold_ms': round(cold_ms, 2),
+        'cold_queries': cold_queries,
+        'median_ms': round(statistics.median(durations), 2),
+        'p95_ms': round(percentile(durations, 0.95), 2),
+        'min_ms': round(min(durations), 2),
+        'queries': max(queries),
+    }
+
+
+def run_all(content, iterations=20, only=None):
+    client = Client()
+    scenarios = get_scenarios(content)
+    # Fill process-level caches (content types, sites, compiled templates)
+    # the same way whichever scenarios are measured.
+    for name, url in scenarios:
+        request(client, url)
+
+    results = {}
+    for name, url in scenarios:
+        if only and name not in only:
+            continue
+        results[name] = run_scenario(client, url, iterations)
+    return results
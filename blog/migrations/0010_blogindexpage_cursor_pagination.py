@@ -0,0 +1,18 @@
+# Generated by Django 3.1.8 on 2026-10-17 20:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_auto_20210511_0520'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogindexpage',
+            name='cursor_pagination',
+            field=models.BooleanField(default=False, help_text='Page through posts with next/previous links instead of page numbers. Deep pages are as cheap to serve as the first one.'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.1.8 on 2026-10-17 20:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_listing_images(apps, schema_editor):
+    BlogPage = apps.get_model('blog', 'BlogPage')
+    Image = apps.get_model('wagtailimages', 'Image')
+
+    first_images = {}
+    for page in BlogPage.objects.only('pk', 'body'):
+        for block in page.body.raw_data:
+            if block['type'] == 'image' and block['value']:
+                first_images[page.pk] = block['value']
+                break
+
+    existing = set(
+        Image.objects.filter(pk__in=set(first_images.values()))
+        .values_list('pk', flat=True)
+    )
+    for page_id, image_id in first_images.items():
+        if image_id in existing:
+            BlogPage.objects.filter(pk=page_id).update(listing_image_id=image_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtailimages', '0023_add_choose_permissions'),
+        ('blog', '0010_blogindexpage_cursor_pagination'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpage',
+            name='listing_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='wagtailimages.image'),
+        ),
+        migrations.RunPython(populate_listing_images, migrations.RunPython.noop),
+    ]
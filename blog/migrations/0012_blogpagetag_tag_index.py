@@ -0,0 +1,17 @@
+# Generated by Django 3.1.8 on 2026-10-17 20:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_blogpage_listing_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blogpagetag',
+            index=models.Index(fields=['tag', 'content_object'], name='blog_blogpa_tag_id_2e41ba_idx'),
+        ),
+    ]
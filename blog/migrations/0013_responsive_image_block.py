@@ -0,0 +1,21 @@
+# Generated by Django 3.1.8 on 2026-10-17 21:00
+
+from django.db import migrations
+import home.blocks
+import wagtail.core.blocks
+import wagtail.core.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_blogpagetag_tag_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='blogpage',
+            name='body',
+            field=wagtail.core.fields.StreamField([('heading', wagtail.core.blocks.CharBlock(form_classname='full title')), ('paragraph', wagtail.core.blocks.RichTextBlock()), ('image', home.blocks.ResponsiveImageBlock())]),
+        ),
+    ]
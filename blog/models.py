@@ -1,5 +1,9 @@
+from urllib.parse import urlencode
+
 from django import forms
+from django.core.cache import cache
 from django.db import models
+from django.db.models import Count, prefetch_related_objects
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 
 from wagtail.core import blocks
@@ -12,55 +16,106 @@ from wagtail.images.edit_handlers import ImageChooserPanel
 from wagtail.search import index
 from wagtail.snippets.models import register_snippet
 from wagtail.core.fields import StreamField
-from wagtail.images.blocks import ImageChooserBlock
 
 from modelcluster.fields import ParentalKey, ParentalManyToManyField
 from modelcluster.contrib.taggit import ClusterTaggableManager
-from taggit.models import TaggedItemBase
+from taggit.models import Tag, TaggedItemBase
+
+from blog.pagination import CursorPaginator, InvalidCursor
+from home.blocks import ResponsiveImageBlock
+from home.images import prefetch_renditions
+from home.mixins import RenderedBodyMixin
 
 
 class BlogIndexPage(Page):
     intro = RichTextField(blank=True)
+    cursor_pagination = models.BooleanField(
+        default=False,
+        help_text=(
+            'Page through posts with next/previous links instead of page '
+            'numbers. Deep pages are as cheap to serve as the first one.'
+        ),
+    )
 
     content_panels = Page.content_panels + [
         FieldPanel('intro', classname='full')
     ]
 
+    settings_panels = Page.settings_panels + [
+        FieldPanel('cursor_pagination'),
+    ]
+
+    # Cache key for the aggregated tag listing. The entry is cleared by the
+    # signal handlers in blog/signals.py whenever a blog post is published,
+    # unpublished or deleted, so it can be kept indefinitely.
+    TAGS_CACHE_KEY = 'blog:all-tags'
+
+    @staticmethod
     def get_all_tags():
         '''
-        Returns a list of all tags associated with all live blog posts.
+        Returns a list of all tags associated with all live blog posts, sorted
+        by name. Each tag is annotated with post_count, the number of live
+        posts that carry it.
+        The list is built from a single grouped query and then cached.
         '''
-        tags = []
-        blog_pages = BlogPage.objects.live()
-        for page in blog_pages:
-            tags += page.get_post_tags()
-        tags = sorted(set(tags))
+        tags = cache.get(BlogIndexPage.TAGS_CACHE_KEY)
+        if tags is None:
+            tags = list(
+                Tag.objects
+                .filter(blog_blogpagetag_items__content_object__live=True)
+                .annotate(post_count=Count('blog_blogpagetag_items'))
+                .order_by('name')
+            )
+            cache.set(BlogIndexPage.TAGS_CACHE_KEY, tags, None)
         return tags
 
+    @staticmethod
+    def clear_tag_cache():
+        cache.delete(BlogIndexPage.TAGS_CACHE_KEY)
+
     def get_context(self, request):
         '''
         Overrides the default get_context() so that:
         - the context includes published posts in reverse chronological order,
         - the context includes a list of all current tags, and
-        - the results are paginated
+        - the results are paginated, either by page number or, when
+          cursor_pagination is set, by ?after=/?before= cursor tokens
         '''
         context = super().get_context(request)
 
-        all_posts = self.get_children().live().order_by('-first_published_at')
+        # Only the posts: the tag listing page lives under the blog too
+        all_posts = BlogPage.objects.child_of(self).live() \
+            .order_by('-first_published_at')
 
         context['tags'] = BlogIndexPage.get_all_tags()
 
-        paginator = Paginator(all_posts, 5)
-        page = request.GET.get('page')
-        try:
-            # If the page exists and the page=x is an int
-            posts = paginator.page(page)
-        except PageNotAnInteger:
-            # If page=x is not an int; show the first page
-            posts = paginator.page(1)
-        except EmptyPage:
-            # If page=x is out of range: return the last page
-            posts = paginator.page(paginator.num_pages)
+        if self.cursor_pagination:
+            paginator = CursorPaginator(all_posts, 5)
+            try:
+                posts = paginator.page(
+                    after=request.GET.get('after'),
+                    before=request.GET.get('before'),
+                )
+            except InvalidCursor:
+                # If the cursor has been tampered with; show the first page
+                posts = paginator.page()
+        else:
+            paginator = Paginator(all_posts, 5)
+            page = request.GET.get('page')
+            try:
+                # If the page exists and the page=x is an int
+                posts = paginator.page(page)
+            except PageNotAnInteger:
+                # If page=x is not an int; show the first page
+                posts = paginator.page(1)
+            except EmptyPage:
+                # If page=x is out of range: return the last page
+                posts = paginator.page(paginator.num_pages)
+
+        BlogPage.prefetch_listing_images(posts)
+        post_tags = BlogPage.get_tags_for_posts(posts, request)
+        for post in posts:
+            post.post_tags = post_tags[post.pk]
         context['posts'] = posts
 
         return context
@@ -80,17 +135,38 @@ class BlogPageTag(TaggedItemBase):
         'BlogPage', related_name='tagged_items', on_delete=models.CASCADE
     )
 
+    class Meta:
+        # Lets the tag listing page find the posts carrying a tag from the
+        # index alone.
+        indexes = [
+            models.Index(fields=['tag', 'content_object']),
+        ]
+
 
-class BlogPage(Page):
+class BlogPage(RenderedBodyMixin, Page):
     date = models.DateField('Post date')
     body = StreamField([
         ('heading', blocks.CharBlock(form_classname='full title')),
         ('paragraph', blocks.RichTextBlock()),
-        ('image', ImageChooserBlock()),
+        ('image', ResponsiveImageBlock()),
     ])
     tags = ClusterTaggableManager(through=BlogPageTag, blank=True)
     categories = ParentalManyToManyField('blog.BlogCategory', blank=True)
 
+    # Denormalised copy of the first image in the body, kept up to date by
+    # save() so that listings can fetch it without walking the StreamField.
+    listing_image = models.ForeignKey(
+        'wagtailimages.Image',
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+        related_name='+',
+    )
+
+    # Filter spec of the thumbnail shown next to each post in listings.
+    LISTING_IMAGE_SPEC = 'fill-100x100'
+
     # Set as a searchable field
     search_fields = Page.search_fields + [
         index.SearchField('body'),
@@ -107,34 +183,112 @@ class BlogPage(Page):
         StreamFieldPanel('body'),
     ]
 
+    def save(self, *args, **kwargs):
+        self.listing_image = self.get_first_image()
+        return super().save(*args, **kwargs)
+
     def get_first_image(self):
         '''
         Returns the first image from the body StreamField.
-        Used for the blog post index page.
+        Used to fill in listing_image when the post is saved.
         '''
         for block in self.body:
-            if block.block_type == 'image':
+            if block.block_type == 'image' and block.value:
                 return block.value
 
-    def get_post_tags(self):
+    @staticmethod
+    def prefetch_listing_images(posts):
+        '''
+        Loads the listing image of each of the given posts, together with its
+        LISTING_IMAGE_SPEC rendition where one has already been generated,
+        using one query for the images and one for the renditions.
+        '''
+        posts = list(posts)
+        prefetch_related_objects(posts, 'listing_image')
+        prefetch_renditions(
+            [post.listing_image for post in posts], BlogPage.LISTING_IMAGE_SPEC
+        )
+
+    def get_context(self, request):
+        '''
+        Adds the post's categories and fetches the renditions of the category
+        icons in one query rather than one per icon.
+        '''
+        context = super().get_context(request)
+        categories = list(self.categories.select_related('icon'))
+        prefetch_renditions(
+            [category.icon for category in categories], 'fill-20x20'
+        )
+        context['categories'] = categories
+        return context
+
+    def get_post_tags(self, request=None):
         '''
         Returns all tags that are related to the blog post in question as a
         list that can be accessed in the template.
         Additionally, a URL is added so that the relevant post can be accessed
         with the tag in question.
-        (Taken from the Wagtail bakery demo:)
+        (Adapted from the Wagtail bakery demo:)
         https://github.com/wagtail/bakerydemo/blob/4469a5a182f3c34db520979bd257a9a5cc4620fa/bakerydemo/blog/models.py#L110
         '''
-        tags = self.tags.all()
-        for tag in tags:
-            tag.url = '/' + '/'.join(s.strip('/') for s in [
-                self.get_parent().url,
-                'tags',
-                tag.slug
-            ])
+        return BlogPage.get_tags_for_posts([self], request)[self.pk]
+
+    @staticmethod
+    def get_tags_for_posts(posts, request=None):
+        '''
+        Returns a dict mapping the id of each of the given posts to a list of
+        PostTag objects, each carrying the URL of the tag listing under the
+        post's parent page.
+        Costs two queries however many posts are passed in: one for the tags
+        and one for the distinct parent pages, whose URLs are resolved once
+        each using Wagtail's cached site root paths.
+        '''
+        posts = list(posts)
+        tags = {post.pk: [] for post in posts}
+        if not posts:
+            return tags
+
+        parent_paths = {post.path[:-Page.steplen] for post in posts}
+        parent_urls = {
+            parent.path: parent.get_url(request)
+            for parent in Page.objects.filter(path__in=parent_paths)
+        }
+
+        tagged_items = BlogPageTag.objects \
+            .filter(content_object_id__in=tags.keys()) \
+            .select_related('tag') \
+            .order_by('tag__name')
+        post_paths = {post.pk: post.path for post in posts}
+        for item in tagged_items:
+            parent_url = parent_urls.get(
+                post_paths[item.content_object_id][:-Page.steplen]
+            )
+            url = None
+            if parent_url:
+                # The tag listing page (BlogTagIndexPage) lives under the blog
+                # index with the slug 'tags' and filters on ?tag=<slug>.
+                url = parent_url + 'tags/?' + urlencode({'tag': item.tag.slug})
+            tags[item.content_object_id].append(
+                PostTag(item.tag.name, item.tag.slug, url)
+            )
         return tags
 
 
+class PostTag:
+    '''
+    A tag as attached to a particular blog post, with the URL of the listing
+    of all posts carrying it. Renders as the tag name.
+    '''
+
+    def __init__(self, name, slug, url):
+        self.name = name
+        self.slug = slug
+        self.url = url
+
+    def __str__(self):
+        return self.name
+
+
 class BlogPageGalleryImage(Orderable):
 
     # Sub-classing Orderable makes it possible to keep track of the image order
@@ -166,21 +320,48 @@ class BlogPageGalleryImage(Orderable):
 class BlogTagIndexPage(Page):
     '''
     Overrides the default get_context() so that:
-    - the context includes only posts associated with a given tag, and
+    - the context includes only posts associated with a given tag, paginated
+      by ?after=/?before= cursor tokens, and
     - the context includes a list of all current tags.
     '''
 
     def get_context(self, request):
         context = super().get_context(request)
 
-        tag = request.GET.get('tag')
-        posts = BlogPage.objects.live().filter(tags__name=tag) \
-            .order_by('-first_published_at')
-        context['posts'] = posts
-
+        # The tag cloud is cached (see BlogIndexPage.get_all_tags), so the tag
+        # named by ?tag= can be looked up in it without touching the database.
+        # Only tags on live posts are listed, which are the only ones that can
+        # have any posts to show. Old links used the tag name rather than the
+        # slug, so fall back to that.
         tags = BlogIndexPage.get_all_tags()
         context['tags'] = tags
 
+        value = request.GET.get('tag')
+        tag = next((t for t in tags if t.slug == value), None) \
+            or next((t for t in tags if t.name == value), None)
+        context['tag'] = tag
+
+        if tag is None:
+            context['posts'] = []
+            return context
+
+        paginator = CursorPaginator(
+            BlogPage.objects.live().filter(tagged_items__tag=tag), 10
+        )
+        try:
+            posts = paginator.page(
+                after=request.GET.get('after'),
+                before=request.GET.get('before'),
+            )
+        except InvalidCursor:
+            posts = paginator.page()
+
+        BlogPage.prefetch_listing_images(posts)
+        post_tags = BlogPage.get_tags_for_posts(posts, request)
+        for post in posts:
+            post.post_tags = post_tags[post.pk]
+        context['posts'] = posts
+
         return context
 
 
@@ -0,0 +1,135 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage:
+    '''
+    One page of results from CursorPaginator. Mirrors the parts of Django's
+    Page API used by the templates (iteration and the has_* methods), with
+    opaque next_cursor/previous_cursor tokens in place of page numbers.
+    '''
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    '''
+    Keyset paginator over a queryset ordered newest first by a datetime field
+    with the primary key as a tie-breaker.
+    Unlike Django's Paginator it never counts the queryset and never uses
+    OFFSET: every page is an indexed range query fetching per_page + 1 rows,
+    plus, when paging from a cursor, an EXISTS query looking one row the
+    other way. Deep pages cost the same as the first one.
+    '''
+
+    def __init__(self, queryset, per_page, field='first_published_at'):
+        self.queryset = queryset.filter(**{field + '__isnull': False})
+        self.per_page = per_page
+        self.field = field
+
+    def encode_cursor(self, obj):
+        value = '{}|{}'.format(getattr(obj, self.field).isoformat(), obj.pk)
+        return urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            value, pk = urlsafe_b64decode(padded).decode().rsplit('|', 1)
+            value = parse_datetime(value)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise InvalidCursor(cursor)
+        if value is None:
+            raise InvalidCursor(cursor)
+        return value, pk
+
+    def newer(self, value, pk, inclusive=False):
+        # The objects listed before the cursor position
+        return self.queryset.filter(
+            Q(**{self.field + '__gt': value})
+            | Q(**{self.field: value, 'pk__gte' if inclusive else 'pk__gt': pk})
+        )
+
+    def older(self, value, pk, inclusive=False):
+        # The objects listed after the cursor position
+        return self.queryset.filter(
+            Q(**{self.field + '__lt': value})
+            | Q(**{self.field: value, 'pk__lte' if inclusive else 'pk__lt': pk})
+        )
+
+    def first_objects(self, queryset):
+        '''
+        Returns the newest per_page objects of queryset, newest first, and
+        whether there are more.
+        '''
+        objects = list(
+            queryset.order_by('-' + self.field, '-pk')[:self.per_page + 1]
+        )
+        return objects[:self.per_page], len(objects) > self.per_page
+
+    def last_objects(self, queryset):
+        '''
+        Returns the oldest per_page objects of queryset, newest first, and
+        whether there are more.
+        '''
+        objects = list(
+            queryset.order_by(self.field, 'pk')[:self.per_page + 1]
+        )
+        return objects[:self.per_page][::-1], len(objects) > self.per_page
+
+    def page(self, after=None, before=None):
+        '''
+        Returns the page of objects following the `after` cursor, or preceding
+        the `before` cursor, or the first page if neither is given. A cursor
+        past the end of the list (e.g. after the posts it pointed at were
+        unpublished) gives the last page, and one before its start the first.
+        Raises InvalidCursor if a cursor cannot be decoded.
+        '''
+        if before:
+            value, pk = self.decode_cursor(before)
+            objects, has_previous = self.last_objects(self.newer(value, pk))
+            if not objects:
+                return self.page()
+            has_next = self.older(value, pk, inclusive=True).exists()
+        elif after:
+            value, pk = self.decode_cursor(after)
+            objects, has_next = self.first_objects(self.older(value, pk))
+            if objects:
+                has_previous = self.newer(value, pk, inclusive=True).exists()
+            else:
+                objects, has_previous = self.last_objects(self.queryset)
+        else:
+            objects, has_next = self.first_objects(self.queryset)
+            has_previous = False
+
+        next_cursor = previous_cursor = None
+        if objects:
+            if has_next:
+                next_cursor = self.encode_cursor(objects[-1])
+            if has_previous:
+                previous_cursor = self.encode_cursor(objects[0])
+        return CursorPage(objects, next_cursor, previous_cursor)
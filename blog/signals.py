@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from wagtail.core.signals import page_published, page_unpublished
+
+from blog.models import BlogIndexPage, BlogPage
+
+
+@receiver(page_published, sender=BlogPage)
+@receiver(page_unpublished, sender=BlogPage)
+@receiver(post_delete, sender=BlogPage)
+def clear_tag_cache(sender, **kwargs):
+    '''
+    Drops the cached tag listing whenever the set of live blog posts (and
+    therefore the set of tags in use) may have changed.
+    '''
+    BlogIndexPage.clear_tag_cache()
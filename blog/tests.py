@@ -0,0 +1,94 @@
+from base64 import urlsafe_b64encode
+from datetime import datetime, timedelta
+
+from django.test import TestCase
+from django.utils.timezone import utc
+from wagtail.core.models import Page
+
+from benchmarks.querycount import QueryCountTestCase
+from blog.pagination import CursorPaginator, InvalidCursor
+
+
+class BlogQueryCountTests(QueryCountTestCase):
+    def test_index_page(self):
+        self.assertConstantQueries('blog_index')
+
+    def test_last_index_page(self):
+        self.assertConstantQueries('blog_index_deep')
+
+    def test_tag_index_page(self):
+        self.assertConstantQueries('blog_tag')
+
+    def test_blog_page(self):
+        self.assertConstantQueries('blog_post')
+
+
+class CursorPaginatorTests(TestCase):
+    def setUp(self):
+        root = Page.objects.get(depth=1)
+        start = datetime(2021, 1, 1, tzinfo=utc)
+        # Seven pages, newest first, with the middle two sharing a timestamp
+        # so the pk tie-breaker is exercised across a page boundary.
+        self.pages = []
+        for i, days in enumerate([7, 6, 5, 4, 4, 2, 1]):
+            self.pages.append(root.add_child(instance=Page(
+                title='Page {}'.format(i), slug='page-{}'.format(i),
+                first_published_at=start - timedelta(days=days),
+            )))
+        self.pages.sort(key=lambda p: (p.first_published_at, p.pk), reverse=True)
+        self.paginator = CursorPaginator(
+            Page.objects.filter(pk__in=[p.pk for p in self.pages]), 3
+        )
+
+    def assertPage(self, page, objects, has_next, has_previous):
+        self.assertEqual(list(page), objects)
+        self.assertEqual(page.has_next(), has_next)
+        self.assertEqual(page.has_previous(), has_previous)
+
+    def test_first_page(self):
+        page = self.paginator.page()
+        self.assertPage(page, self.pages[:3], True, False)
+
+    def test_middle_page(self):
+        first = self.paginator.page()
+        page = self.paginator.page(after=first.next_cursor)
+        self.assertPage(page, self.pages[3:6], True, True)
+
+    def test_last_page(self):
+        first = self.paginator.page()
+        middle = self.paginator.page(after=first.next_cursor)
+        page = self.paginator.page(after=middle.next_cursor)
+        self.assertPage(page, self.pages[6:], False, True)
+
+    def test_before(self):
+        first = self.paginator.page()
+        middle = self.paginator.page(after=first.next_cursor)
+        last = self.paginator.page(after=middle.next_cursor)
+        page = self.paginator.page(before=last.previous_cursor)
+        self.assertPage(page, self.pages[3:6], True, True)
+        page = self.paginator.page(before=page.previous_cursor)
+        self.assertPage(page, self.pages[:3], True, False)
+
+    def test_before_with_nothing_after(self):
+        cursor = self.paginator.encode_cursor(self.pages[-1])
+        self.pages.pop().delete()
+        page = self.paginator.page(before=cursor)
+        self.assertPage(page, self.pages[-3:], False, True)
+
+    def test_after_past_the_end_gives_last_page(self):
+        cursor = self.paginator.encode_cursor(self.pages[-1])
+        page = self.paginator.page(after=cursor)
+        self.assertPage(page, self.pages[-3:], False, True)
+
+    def test_before_past_the_start_gives_first_page(self):
+        cursor = self.paginator.encode_cursor(self.pages[0])
+        page = self.paginator.page(before=cursor)
+        self.assertPage(page, self.pages[:3], True, False)
+
+    def test_tampered_cursor(self):
+        for cursor in ['garbage', '!!!', urlsafe_b64encode(b'yesterday|1').decode(),
+                       urlsafe_b64encode(b'2021-01-01T00:00:00|x').decode()]:
+            with self.assertRaises(InvalidCursor):
+                self.paginator.page(after=cursor)
+            with self.assertRaises(InvalidCursor):
+                self.paginator.page(before=cursor)
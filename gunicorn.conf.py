@@ -0,0 +1,95 @@
+"""
+Gunicorn settings for the production container, read from the environment.
+
+GUNICORN_WORKERS        worker processes (default: 2 x CPUs + 1)
+GUNICORN_THREADS        threads per sync worker (default: 4); ignored for ASGI
+GUNICORN_TIMEOUT        seconds before a silent worker is restarted (default: 60,
+                        which leaves room for generating image renditions)
+GUNICORN_MAX_REQUESTS   requests before a worker is recycled (default: 1000),
+                        staggered by up to GUNICORN_MAX_REQUESTS_JITTER (100)
+GUNICORN_PRELOAD        load the app before forking workers (default: 1)
+SERVER_INTERFACE        "wsgi" (default) or "asgi", which selects the Uvicorn
+                        worker class; the app module is chosen in the Dockerfile
+RENDITION_WORKERS       processes used by the rendition worker that the master
+                        starts (default: 2); 0 starts none
+"""
+
+import os
+import subprocess
+import sys
+
+
+def cpu_count():
+    # Only the CPUs this container may run on
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+bind = '0.0.0.0:' + os.environ.get('PORT', '8000')
+
+workers = env_int('GUNICORN_WORKERS', 2 * cpu_count() + 1)
+threads = env_int('GUNICORN_THREADS', 4)
+if os.environ.get('SERVER_INTERFACE') == 'asgi':
+    worker_class = 'uvicorn.workers.UvicornWorker'
+elif threads > 1:
+    worker_class = 'gthread'
+else:
+    worker_class = 'sync'
+
+timeout = env_int('GUNICORN_TIMEOUT', 60)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = env_int('GUNICORN_KEEPALIVE', 5)
+
+# Recycle workers now and then to bound memory growth, at staggered times so
+# that they do not all restart at once.
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER', 100)
+
+# Import Django and Wagtail once in the master so that workers share the
+# loaded code copy-on-write and start quickly when recycled.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-')
+errorlog = '-'
+# Workers keep temporary files in memory rather than on the container's disk
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def when_ready(server):
+    if preload_app:
+        from mysite.warmup import warm_up
+        warm_up()
+    # A single process generates the renditions queued by every worker (see
+    # home/renditions.py), rather than a process pool in each of them.
+    server.rendition_worker = None
+    if env_int('RENDITION_WORKERS', 2):
+        server.rendition_worker = subprocess.Popen(
+            [sys.executable, 'manage.py', 'generate_renditions', '--watch'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+
+
+def on_exit(server):
+    worker = getattr(server, 'rendition_worker', None)
+    if worker is not None:
+        worker.terminate()
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        from mysite.warmup import warm_up
+        warm_up()
+
+
+def post_fork(server, worker):
+    # Connections opened in the master while preloading the app belong to
+    # the master; each worker opens its own.
+    if preload_app:
+        from django.db import connections
+        connections.close_all()
@@ -0,0 +1,11 @@
+from wagtail.images.blocks import ImageChooserBlock
+
+
+class ResponsiveImageBlock(ImageChooserBlock):
+    '''
+    An image block rendered with a srcset of several widths, so that each
+    client downloads only the size it displays.
+    '''
+    class Meta:
+        icon = 'image'
+        template = 'home/blocks/responsive_image.html'
@@ -0,0 +1,216 @@
+'''
+Bulk rendition lookups for pages that show many images, and WebP variants of
+the renditions our templates use.
+
+prefetch_renditions() fetches the renditions of a list of images in a single
+query and attaches them to the image objects, where the {% image %} and
+{% picture %} tags from the prefetched_images template library pick them up
+instead of looking each one up separately.
+
+Each filter spec has at most one WebP variant per image, stored as a
+rendition with the spec '<spec>|format-webp|webpquality-<n>'. Where
+RENDITION_BYTE_BUDGETS sets a budget for the spec, n is the highest quality
+whose file fits within it; otherwise it is WEBP_DEFAULT_QUALITY. Variants
+are only generated ahead of time, by home/renditions.py. A page that needs
+one that does not exist yet shows the fallback rendition meanwhile.
+'''
+
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from wagtail.images import get_image_model
+from wagtail.images.models import Filter
+
+# Widths offered in the srcset of responsive images (see ResponsiveImageBlock),
+# the one used for the fallback src, and the sizes hint for body images, which
+# are shown at up to 400px wide.
+RESPONSIVE_IMAGE_WIDTHS = (320, 400, 800)
+RESPONSIVE_IMAGE_SPECS = tuple('width-%d' % width for width in RESPONSIVE_IMAGE_WIDTHS)
+RESPONSIVE_IMAGE_FALLBACK_SPEC = 'width-400'
+RESPONSIVE_IMAGE_SIZES = '(max-width: 440px) 100vw, 400px'
+
+WEBP_SUFFIX = '|format-webp'
+WEBP_DEFAULT_QUALITY = 80
+WEBP_MIN_QUALITY = 30
+# Seconds after which a WebP generation lock is considered abandoned, and
+# a variant missed by a page request is scheduled again
+WEBP_LOCK_TIMEOUT = 300
+
+
+@lru_cache(maxsize=None)
+def webp_supported():
+    try:
+        from PIL import features
+    except ImportError:
+        return False
+    return features.check('webp')
+
+
+def webp_key(spec):
+    '''
+    Returns the key under which the WebP variant of spec is prefetched.
+    '''
+    return spec + WEBP_SUFFIX
+
+
+def prefetch_renditions(images, *specs):
+    '''
+    Attaches the existing renditions of the given images for the given filter
+    specs, and their WebP variants, to each image as prefetched_renditions,
+    a dict keyed by filter spec (or webp_key(spec) for the WebP variant).
+    None values are skipped, and the same image may appear more than once.
+    Renditions that have not been generated yet are left out; the template
+    tags generate those as usual.
+    '''
+    images = [image for image in images if image is not None]
+    if not images or not specs:
+        return images
+
+    by_pk = {}
+    for image in images:
+        if not hasattr(image, 'prefetched_renditions'):
+            image.prefetched_renditions = {}
+        by_pk.setdefault(image.pk, []).append(image)
+
+    condition = Q(filter_spec__in=specs)
+    for spec in specs:
+        condition |= Q(filter_spec__startswith=webp_key(spec) + '|')
+    Rendition = get_image_model().get_rendition_model()
+    renditions = Rendition.objects.filter(condition, image_id__in=by_pk.keys())
+    for rendition in renditions:
+        if rendition.filter_spec in specs:
+            key = rendition.filter_spec
+        else:
+            key = rendition.filter_spec.rsplit('|', 1)[0]
+            if key[:-len(WEBP_SUFFIX)] not in specs:
+                continue
+        image_filter = Filter(spec=rendition.filter_spec)
+        for image in by_pk[rendition.image_id]:
+            if rendition.focal_point_key == image_filter.get_cache_key(image):
+                rendition.image = image
+                image.prefetched_renditions[key] = rendition
+    return images
+
+
+def get_prefetched_rendition(image, spec):
+    prefetched = getattr(image, 'prefetched_renditions', None)
+    if prefetched:
+        return prefetched.get(spec)
+
+
+def find_webp_rendition(image, spec):
+    '''
+    Returns the WebP variant of the given image and filter spec if it has
+    been generated, using the prefetched one if there is one.
+    '''
+    rendition = get_prefetched_rendition(image, webp_key(spec))
+    if rendition is not None:
+        return rendition
+
+    Rendition = get_image_model().get_rendition_model()
+    for rendition in Rendition.objects.filter(
+        image=image, filter_spec__startswith=webp_key(spec) + '|'
+    ):
+        if rendition.focal_point_key == Filter(rendition.filter_spec).get_cache_key(image):
+            return rendition
+
+
+def get_webp_rendition(image, spec):
+    '''
+    Returns the WebP variant of the given image and filter spec for a page
+    being rendered. If it has not been generated yet, None is returned, so
+    the page offers only the fallback rendition rather than encoding WebP
+    files during the request, and the image is queued for the rendition
+    worker if there is one (see home/renditions.py). Also returns None if
+    Pillow was built without WebP support.
+    '''
+    if not webp_supported():
+        return None
+    rendition = find_webp_rendition(image, spec)
+    if rendition is None and settings.RENDITION_WORKERS:
+        queued = 'home:webp-queued:{}'.format(image.pk)
+        if cache.add(queued, True, WEBP_LOCK_TIMEOUT):
+            # Imported here as home.renditions imports this module
+            from home.renditions import queue_renditions
+            queue_renditions([image.pk])
+    return rendition
+
+
+def generate_webp_rendition(image, spec):
+    '''
+    Returns the WebP variant of the given image and filter spec, generating
+    it if needed. Returns None if Pillow was built without WebP support, or
+    if another process is generating the same variant.
+    '''
+    if not webp_supported():
+        return None
+    rendition = find_webp_rendition(image, spec)
+    if rendition is not None:
+        return rendition
+
+    # The budget search deletes the renditions it rejects, so two processes
+    # searching at once could delete each other's results.
+    lock = 'home:webp-lock:{}:{}'.format(image.pk, spec)
+    if not cache.add(lock, True, WEBP_LOCK_TIMEOUT):
+        return None
+    try:
+        budget = getattr(settings, 'RENDITION_BYTE_BUDGETS', {}).get(spec)
+        if budget is None:
+            return get_webp_at_quality(image, spec, WEBP_DEFAULT_QUALITY)
+        return generate_webp_within_budget(image, spec, budget)
+    finally:
+        cache.delete(lock)
+
+
+def get_webp_at_quality(image, spec, quality):
+    return image.get_rendition(
+        '{}|webpquality-{}'.format(webp_key(spec), quality)
+    )
+
+
+def generate_webp_within_budget(image, spec, budget):
+    '''
+    Binary searches for the highest WebP quality between WEBP_MIN_QUALITY and
+    WEBP_DEFAULT_QUALITY whose rendition is no larger than budget bytes, and
+    deletes the renditions generated along the way. If even the lowest
+    quality does not fit, that rendition is kept.
+    '''
+    low, high = WEBP_MIN_QUALITY, WEBP_DEFAULT_QUALITY
+    best = None
+    while low <= high:
+        quality = (low + high) // 2
+        rendition = get_webp_at_quality(image, spec, quality)
+        if rendition.file.size <= budget:
+            if best is not None:
+                best.delete()
+            best = rendition
+            low = quality + 1
+        else:
+            rendition.delete()
+            high = quality - 1
+    if best is None:
+        best = get_webp_at_quality(image, spec, WEBP_MIN_QUALITY)
+    return best
+
+
+def get_responsive_renditions(image, webp=False):
+    '''
+    Returns the renditions of the image for RESPONSIVE_IMAGE_SPECS (or their
+    WebP variants), using prefetched ones where possible and leaving out
+    renditions that are no wider than a smaller one, as happens when the
+    original image is narrower than the larger widths.
+    '''
+    renditions = []
+    for spec in RESPONSIVE_IMAGE_SPECS:
+        if webp:
+            rendition = get_webp_rendition(image, spec)
+        else:
+            rendition = get_prefetched_rendition(image, spec) or image.get_rendition(spec)
+        if rendition is None:
+            return []
+        if not renditions or rendition.width > renditions[-1].width:
+            renditions.append(rendition)
+    return renditions
@@ -0,0 +1,125 @@
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from wagtail.images import get_image_model
+
+from home.renditions import (
+    generate_pending_renditions, generate_renditions, get_filter_specs
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates missing renditions of every image for the filter specs '
+        'used in our templates, or with --watch, keeps generating those of '
+        'the images queued by saves and page requests.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--spec', action='append', dest='specs',
+            help='Only generate this filter spec (may be given more than once).',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=50,
+            help='Number of images handled per batch.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help=(
+                'Resize images in this many worker processes (default: none, '
+                'or RENDITION_WORKERS with --watch).'
+            ),
+        )
+        parser.add_argument(
+            '--watch', action='store_true',
+            help='Keep running as the rendition worker, polling the queue.',
+        )
+
+    def handle(self, **options):
+        if options['watch']:
+            return self.watch(options)
+
+        specs = tuple(options['specs'] or get_filter_specs())
+        self.stdout.write('Filter specs: {}'.format(', '.join(specs)))
+
+        image_ids = list(
+            get_image_model().objects.order_by('pk').values_list('pk', flat=True)
+        )
+        chunk_size = options['chunk_size']
+        chunks = [
+            image_ids[i:i + chunk_size]
+            for i in range(0, len(image_ids), chunk_size)
+        ]
+        started = time.monotonic()
+        done = 0
+
+        if options['workers']:
+            # Worker processes are forked, so they must not inherit open
+            # database connections.
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers']) as executor:
+                results = executor.map(
+                    generate_renditions, chunks, [specs] * len(chunks)
+                )
+                for chunk in chunks:
+                    next(results)
+                    done += len(chunk)
+                    self.report(done, len(image_ids), started)
+        else:
+            for chunk in chunks:
+                generate_renditions(chunk, specs)
+                done += len(chunk)
+                self.report(done, len(image_ids), started)
+
+        self.stdout.write('')
+
+    def watch(self, options):
+        workers = options['workers']
+        if workers is None:
+            workers = settings.RENDITION_WORKERS
+        executor = None
+        if workers:
+            # Spawned rather than forked, as this process keeps using its
+            # database connection between batches.
+            executor = ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        interval = getattr(settings, 'RENDITION_QUEUE_INTERVAL', 5)
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    handled = generate_pending_renditions(
+                        executor, options['chunk_size'], max(workers, 1) * 2
+                    )
+                except Exception:
+                    logger.exception('Could not generate queued renditions')
+                    handled = 0
+                if handled:
+                    self.stdout.write('Generated renditions of {} images'.format(handled))
+                else:
+                    time.sleep(interval)
+        finally:
+            if executor:
+                executor.shutdown()
+
+    def report(self, done, total, started):
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(
+            '\rImages: {}/{} ({:.1f} images/s)'.format(done, total, rate),
+            ending=''
+        )
+        self.stdout.flush()
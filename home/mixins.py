@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from home.images import RESPONSIVE_IMAGE_SPECS, prefetch_renditions
+from mysite.cache import bump_version, get_version
+
+
+# Rendered bodies are keyed on the live revision, so publishing a new revision
+# never serves stale HTML. The 'page-body' version covers what the HTML
+# depends on beyond the revision itself (the URLs of linked pages, documents
+# and image renditions) and is bumped in home/signals.py, and by
+# home/renditions.py when renditions are generated after a body was rendered
+# without them. Entries also expire after PAGE_BODY_CACHE_TIMEOUT, in case a
+# change goes unnoticed.
+def clear_body_cache():
+    bump_version('page-body')
+
+
+class RenderedBodyMixin:
+    '''
+    For pages with a 'body' StreamField: renders the body of each published
+    revision once and keeps the HTML in the cache.
+    '''
+    body_template = 'home/page_body.html'
+
+    def get_body_cache_key(self):
+        return 'home:page-body:%s:%s:%s' % (
+            get_version('page-body'), self.pk, self.live_revision_id
+        )
+
+    def get_body_html(self, request=None):
+        '''
+        Returns the rendered body, from the cache when this is the live
+        revision. Previews and pages with no live revision are rendered
+        directly.
+        '''
+        if not self.live_revision_id or getattr(request, 'is_preview', False):
+            return self.render_body()
+        key = self.get_body_cache_key()
+        html = cache.get(key)
+        if html is None:
+            html = self.render_body()
+            cache.set(
+                key, html, getattr(settings, 'PAGE_BODY_CACHE_TIMEOUT', 86400)
+            )
+        return html
+
+    def render_body(self):
+        prefetch_renditions(
+            [block.value for block in self.body if block.block_type == 'image'],
+            *RESPONSIVE_IMAGE_SPECS
+        )
+        return render_to_string(self.body_template, {'page': self})
+
+    def get_context(self, request, *args, **kwargs):
+        context = super().get_context(request, *args, **kwargs)
+        context['body_html'] = self.get_body_html(request)
+        return context
@@ -9,6 +9,8 @@ from wagtail.snippets.models import register_snippet
 
 from modelcluster.fields import ParentalKey, ParentalManyToManyField
 
+from home.images import prefetch_renditions
+
 
 class HomePage(Page):
     name = models.CharField(blank=False, null=True, max_length=200)
@@ -24,6 +26,22 @@ class HomePage(Page):
         FieldPanel('social_links', widget=forms.CheckboxSelectMultiple),
     ]
 
+    def get_context(self, request):
+        '''
+        Adds the gallery images and social links, with the renditions of their
+        images fetched in one query rather than one per image.
+        '''
+        context = super().get_context(request)
+        gallery_images = list(self.gallery_images.select_related('image'))
+        social_links = list(self.social_links.select_related('icon'))
+        prefetch_renditions(
+            [item.image for item in gallery_images], 'max-200x200'
+        )
+        prefetch_renditions([link.icon for link in social_links], 'width-30')
+        context['gallery_images'] = gallery_images
+        context['social_links'] = social_links
+        return context
+
 
 class HomePageGalleryImage(Orderable):
     page = ParentalKey(
@@ -77,3 +95,17 @@ class SocialMediaLink(models.Model):
 
     class Meta:
         verbose_name_plural = 'social media links'
+
+
+class PendingRendition(models.Model):
+    '''
+    An image whose renditions are waiting to be generated by the rendition
+    worker (see home/renditions.py). An image may be queued more than once;
+    the worker handles it once per batch. Not a foreign key, so that queueing
+    an image deleted in the meantime does not fail; the worker skips it.
+    '''
+    image_id = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return 'Renditions of image {}'.format(self.image_id)
@@ -0,0 +1,224 @@
+'''
+Pre-generates image renditions so that page requests never resize images.
+
+The filter specs are discovered from the {% image %} and {% picture %} tags
+in the project's own templates, plus the widths of responsive images and any
+listed in the RENDITION_EXTRA_FILTER_SPECS setting. Specs used by
+{% picture %} and responsive images also get their WebP variant (see
+home/images.py).
+
+Once the transaction that saved an image or published a page has committed,
+the image is queued for the rendition worker, a single
+`manage.py generate_renditions --watch` process that the gunicorn master
+starts when RENDITION_WORKERS is set. Page requests that find a WebP
+variant missing queue the image the same way. With RENDITION_WORKERS at 0,
+saves generate renditions in the saving process and request misses are left
+to the backfill command.
+'''
+
+import os
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.template import engines
+from django.template.utils import get_app_template_dirs
+
+from wagtail.core.fields import StreamField
+from wagtail.images import get_image_model
+from wagtail.images.blocks import ImageChooserBlock
+from wagtail.images.exceptions import InvalidFilterSpecError
+from wagtail.images.models import Filter, SourceImageIOError
+
+from modelcluster.fields import ParentalKey
+
+from home.images import (
+    RESPONSIVE_IMAGE_SPECS, generate_webp_rendition, webp_supported
+)
+from home.mixins import clear_body_cache
+from home.models import PendingRendition
+from mysite import page_cache
+
+# {% image <expr> <filter spec> ... %} or {% picture <expr> <filter spec> ... %}
+IMAGE_TAG_RE = re.compile(r'{%\s*(image|picture)\s+\S+\s+([^\s%]+)')
+
+def get_template_dirs():
+    dirs = list(engines['django'].engine.dirs)
+    dirs.extend(get_app_template_dirs('templates'))
+    # Only our own templates; the admin's {% image %} tags are not ours to
+    # pre-generate.
+    base_dir = os.path.join(str(settings.BASE_DIR), '')
+    return [str(d) for d in dirs if str(d).startswith(base_dir)]
+
+
+@lru_cache(maxsize=None)
+def find_template_specs():
+    '''
+    Returns a dict mapping each valid filter spec used by the project's
+    templates to the set of tag names ('image', 'picture') that use it.
+    '''
+    found = {}
+    for template_dir in get_template_dirs():
+        for root, _, files in os.walk(template_dir):
+            for name in files:
+                if not name.endswith('.html'):
+                    continue
+                with open(os.path.join(root, name), encoding='utf-8') as f:
+                    for tag, spec in IMAGE_TAG_RE.findall(f.read()):
+                        found.setdefault(spec, set()).add(tag)
+    for spec in list(found):
+        try:
+            Filter(spec).operations
+        except InvalidFilterSpecError:
+            del found[spec]
+    return found
+
+
+def get_filter_specs():
+    '''
+    Returns the sorted filter specs used by {% image %} and {% picture %} tags
+    in the project's templates and the RENDITION_EXTRA_FILTER_SPECS setting.
+    '''
+    specs = set(getattr(settings, 'RENDITION_EXTRA_FILTER_SPECS', []))
+    specs.update(find_template_specs())
+    specs.update(RESPONSIVE_IMAGE_SPECS)
+    return tuple(sorted(specs))
+
+
+def get_webp_filter_specs():
+    specs = {
+        spec for spec, tags in find_template_specs().items()
+        if 'picture' in tags
+    }
+    specs.update(RESPONSIVE_IMAGE_SPECS)
+    return tuple(sorted(specs))
+
+
+def generate_renditions(image_ids, specs=None):
+    '''
+    Creates any missing renditions of the given images for the given filter
+    specs (all discovered specs by default), and their WebP variants where
+    {% picture %} uses the spec. Returns the number of renditions looked up
+    or created.
+    If any were created, cached page bodies and responses are cleared, as
+    they were rendered without them (e.g. with no WebP <source>, when the
+    body was rendered on publish before the rendition worker got to it).
+    '''
+    specs = specs or get_filter_specs()
+    webp_specs = get_webp_filter_specs() if webp_supported() else ()
+    Rendition = get_image_model().get_rendition_model()
+    last_id = Rendition.objects.aggregate(last_id=Max('pk'))['last_id'] or 0
+    count = 0
+    for image in get_image_model().objects.filter(pk__in=image_ids):
+        try:
+            for spec in specs:
+                image.get_rendition(spec)
+                count += 1
+                if spec in webp_specs:
+                    generate_webp_rendition(image, spec)
+                    count += 1
+        except SourceImageIOError:
+            continue
+    if Rendition.objects.filter(image_id__in=image_ids, pk__gt=last_id).exists():
+        clear_body_cache()
+        page_cache.clear_all()
+    return count
+
+
+def queue_renditions(image_ids):
+    '''
+    Queues the given images for the rendition worker once the current
+    transaction commits.
+    '''
+    image_ids = sorted(set(image_ids))
+    if not image_ids:
+        return
+    transaction.on_commit(lambda: PendingRendition.objects.bulk_create([
+        PendingRendition(image_id=image_id) for image_id in image_ids
+    ]))
+
+
+def schedule_renditions(image_ids):
+    '''
+    Generates renditions for the given images after the current transaction
+    commits: in the rendition worker if RENDITION_WORKERS is set, otherwise
+    in this process.
+    '''
+    image_ids = sorted(set(image_ids))
+    if not image_ids:
+        return
+    if settings.RENDITION_WORKERS:
+        queue_renditions(image_ids)
+    else:
+        transaction.on_commit(lambda: generate_renditions(image_ids))
+
+
+def generate_pending_renditions(executor=None, chunk_size=50, chunks=4):
+    '''
+    Generates the renditions of up to chunks x chunk_size of the queued
+    images, spread over executor's processes if one is given, and removes
+    them from the queue. Returns the number of images handled.
+    '''
+    pending = list(
+        PendingRendition.objects.order_by('pk')
+        .values_list('pk', 'image_id')[:chunk_size * chunks]
+    )
+    image_ids = sorted({image_id for _, image_id in pending})
+    batches = [
+        image_ids[i:i + chunk_size]
+        for i in range(0, len(image_ids), chunk_size)
+    ]
+    try:
+        if executor is None:
+            for batch in batches:
+                generate_renditions(batch)
+        else:
+            list(executor.map(generate_renditions, batches))
+    finally:
+        # Even if generation failed, so that an image that cannot be
+        # processed is not retried forever; the backfill command will try it
+        # again. Only the rows read above are removed, as the image may have
+        # been queued again since, e.g. after a new focal point was set.
+        PendingRendition.objects.filter(pk__in=[pk for pk, _ in pending]).delete()
+    return len(image_ids)
+
+
+def get_image_fields(model):
+    image_model = get_image_model()
+    return [
+        field for field in model._meta.concrete_fields
+        if field.is_relation and field.related_model is image_model
+    ]
+
+
+def get_image_ids(obj):
+    '''
+    Returns the ids of images used by obj through image foreign keys, image
+    blocks at the top level of its StreamFields and its child objects (such
+    as gallery images).
+    '''
+    ids = [
+        getattr(obj, field.attname) for field in get_image_fields(type(obj))
+    ]
+    for field in obj._meta.concrete_fields:
+        if not isinstance(field, StreamField):
+            continue
+        image_blocks = {
+            name for name, block in field.stream_block.child_blocks.items()
+            if isinstance(block, ImageChooserBlock)
+        }
+        ids.extend(
+            block['value'] for block in getattr(obj, field.attname).raw_data
+            if block['type'] in image_blocks
+        )
+    for relation in obj._meta.related_objects:
+        if not isinstance(relation.field, ParentalKey):
+            continue
+        image_fields = get_image_fields(relation.related_model)
+        if not image_fields:
+            continue
+        for child in getattr(obj, relation.get_accessor_name()).all():
+            ids.extend(getattr(child, field.attname) for field in image_fields)
+    return [pk for pk in ids if pk]
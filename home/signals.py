@@ -0,0 +1,142 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from wagtail.core.models import Page, Site
+from wagtail.core.signals import (
+    page_published, page_unpublished, post_page_move
+)
+from wagtail.documents import get_document_model
+from wagtail.images import get_image_model
+from wagtailmenus.models import MainMenu, MainMenuItem
+
+from blog.models import BlogCategory
+from home.models import Footer, SocialMediaLink
+from home.mixins import RenderedBodyMixin, clear_body_cache
+from home.renditions import get_image_ids, schedule_renditions
+from home.templatetags.footer import clear_footer_cache
+from home.templatetags.fragment_cache import clear_fragment_cache
+from home.templatetags.site_menu import clear_menu_cache
+from mysite import page_cache
+
+
+@receiver(post_save, sender=Footer)
+@receiver(post_delete, sender=Footer)
+def footer_changed(sender, **kwargs):
+    clear_footer_cache()
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+def page_changed(sender, instance, **kwargs):
+    # Pages in the main menu are linked from every page
+    if instance.show_in_menus or getattr(instance, '_was_in_menus', False):
+        page_cache.clear_all()
+    else:
+        page_cache.clear_page(instance)
+    clear_menu_cache()
+
+
+@receiver(post_page_move)
+def page_moved(sender, **kwargs):
+    page_cache.clear_all()
+    clear_menu_cache()
+    clear_body_cache()
+    clear_footer_cache()
+
+
+@receiver(post_delete)
+def page_deleted(sender, **kwargs):
+    if issubclass(sender, Page):
+        page_cache.clear_all()
+        clear_menu_cache()
+        clear_body_cache()
+        clear_footer_cache()
+
+
+# Snippets and menus that are shown on many pages
+@receiver(post_save, sender=Footer)
+@receiver(post_delete, sender=Footer)
+@receiver(post_save, sender=SocialMediaLink)
+@receiver(post_delete, sender=SocialMediaLink)
+@receiver(post_save, sender=BlogCategory)
+@receiver(post_delete, sender=BlogCategory)
+@receiver(post_save, sender=MainMenu)
+@receiver(post_save, sender=MainMenuItem)
+@receiver(post_delete, sender=MainMenuItem)
+def shared_content_changed(sender, **kwargs):
+    page_cache.clear_all()
+
+
+@receiver(post_save, sender=MainMenu)
+@receiver(post_delete, sender=MainMenu)
+@receiver(post_save, sender=MainMenuItem)
+@receiver(post_delete, sender=MainMenuItem)
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def menu_changed(sender, **kwargs):
+    clear_menu_cache()
+
+
+# Renditions are generated ahead of the first request that needs them
+@receiver(post_save, sender=get_image_model())
+def image_saved(sender, instance, **kwargs):
+    schedule_renditions([instance.pk])
+
+
+@receiver(page_published)
+@receiver(post_save, sender=SocialMediaLink)
+@receiver(post_save, sender=BlogCategory)
+def images_used(sender, instance, **kwargs):
+    schedule_renditions(get_image_ids(instance))
+
+
+# Rendered page bodies and the footer embed the URLs of linked pages,
+# documents and image renditions
+@receiver(page_unpublished)
+@receiver(post_save, sender=get_image_model())
+@receiver(post_delete, sender=get_image_model())
+@receiver(post_save, sender=get_document_model())
+@receiver(post_delete, sender=get_document_model())
+def body_links_changed(sender, **kwargs):
+    clear_body_cache()
+    clear_footer_cache()
+
+
+@receiver(pre_save)
+def page_saving(sender, instance, update_fields=None, **kwargs):
+    # Page.save() has set the new url_path by now, but the row still has the
+    # old one. A slug change does not send post_page_move, and a page taken
+    # out of the menus no longer says that it was in them.
+    if not issubclass(sender, Page) or instance.pk is None:
+        return
+    if update_fields is not None and not {'url_path', 'show_in_menus'} & set(update_fields):
+        return
+    old = Page.objects.filter(pk=instance.pk) \
+        .values('url_path', 'show_in_menus').first()
+    if old is not None:
+        instance._url_path_changed = old['url_path'] != instance.url_path
+        instance._was_in_menus = old['show_in_menus']
+
+
+@receiver(page_published)
+def page_url_changed(sender, instance, **kwargs):
+    # Other pages' bodies, the footer and cached responses link to the old URL
+    if getattr(instance, '_url_path_changed', False):
+        page_cache.clear_all()
+        clear_body_cache()
+        clear_footer_cache()
+
+
+@receiver(page_published)
+def warm_body_cache(sender, instance, **kwargs):
+    if isinstance(instance, RenderedBodyMixin):
+        transaction.on_commit(instance.get_body_html)
+
+
+# Fragments cached with {% depcache %} name the models they are built from.
+# Models outside fragment_cache.DEPENDENCY_MODELS are ignored.
+@receiver(post_save)
+@receiver(post_delete)
+def model_changed(sender, **kwargs):
+    clear_fragment_cache(sender)
@@ -1,12 +1,43 @@
+from functools import lru_cache
+
 from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
 from home.models import Footer
+from mysite.cache import bump_version, get_version
+from mysite.instrumentation import timed
 
 register = template.Library()
 
 
-@register.inclusion_tag('home/footer.html', takes_context=True)
-def footer(context):
-    return {
-        'footer': Footer.objects.get(pk=1),
-        'request': context['request'],
-    }
+# The rendered footer is cached under a version that is replaced whenever the
+# Footer snippet changes, or a page, document or image it may link to moves
+# or goes away (see home/signals.py). Each process keeps the last few
+# versions it has rendered in memory, so the only per-request cost is
+# fetching the current version from the shared cache.
+def clear_footer_cache():
+    bump_version('footer')
+
+
+@lru_cache(maxsize=4)
+def render_footer(version):
+    '''
+    Returns the footer HTML for the given cache version, rendering it from
+    the Footer snippet if no other process has done so yet. A missing
+    snippet renders as an empty footer.
+    '''
+    key = 'home:footer:html:' + version
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string('home/footer.html', {
+            'footer': Footer.objects.first(),
+        })
+        cache.set(key, html, None)
+    return html
+
+
+@register.simple_tag
+@timed('footer')
+def footer():
+    return render_footer(get_version('footer'))
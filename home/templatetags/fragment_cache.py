@@ -0,0 +1,106 @@
+from hashlib import md5
+
+from django import template
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+
+from mysite.cache import bump_version, get_version
+from mysite.instrumentation import timer
+
+register = template.Library()
+
+
+# A fragment declares the models it is built from, and is cached under the
+# current version of each of them. Saving or deleting an instance of a model
+# replaces its version (see home/signals.py), so every fragment depending on
+# it is rendered afresh on its next use.
+#
+# Only the models listed here are tracked, so that other writes (sessions,
+# revisions, renditions) cost nothing. Naming any other model in a template
+# is a syntax error rather than a fragment that never updates.
+DEPENDENCY_MODELS = (
+    'blog.BlogCategory',
+    'blog.BlogPage',
+    'blog.BlogPageTag',
+    'home.Footer',
+    'home.SocialMediaLink',
+    'taggit.Tag',
+    'wagtailcore.Page',
+)
+_tracked_labels = {label.lower() for label in DEPENDENCY_MODELS}
+
+
+def clear_fragment_cache(model):
+    # A multi-table subclass (such as a page type) also changes its parents
+    for model in [model] + model._meta.get_parent_list():
+        if model._meta.label_lower in _tracked_labels:
+            bump_version('model:' + model._meta.label_lower)
+
+
+class DependencyCacheNode(template.Node):
+    def __init__(self, nodelist, fragment_name, models, vary_on):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.version_names = ['model:' + model._meta.label_lower for model in models]
+        self.vary_on = vary_on
+
+    def get_cache_key(self, context):
+        parts = [get_version(name) for name in self.version_names]
+        parts += [str(var.resolve(context)) for var in self.vary_on]
+        return 'home:fragment:%s:%s' % (
+            self.fragment_name, md5(':'.join(parts).encode()).hexdigest()
+        )
+
+    def render(self, context):
+        key = self.get_cache_key(context)
+        html = cache.get(key)
+        if html is None:
+            with timer('fragment'):
+                html = self.nodelist.render(context)
+            cache.set(
+                key, html, getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 3600)
+            )
+        return html
+
+
+@register.tag
+def depcache(parser, token):
+    '''
+    Caches the enclosed template fragment until an instance of one of the
+    given models is saved or deleted. Any further arguments are values the
+    fragment varies on:
+
+        {% depcache "blog-tags" "taggit.Tag blog.BlogPageTag" page.pk %}
+            ...
+        {% enddepcache %}
+    '''
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            "'%s' takes a fragment name, the models it depends on and "
+            "optionally values it varies on" % bits[0]
+        )
+    fragment_name, labels = [
+        bit.strip('"\'') for bit in bits[1:3]
+    ]
+    models = []
+    for label in labels.split():
+        try:
+            model = apps.get_model(label)
+        except (LookupError, ValueError):
+            raise template.TemplateSyntaxError(
+                "'%s' depends on unknown model '%s'" % (bits[0], label)
+            )
+        if model._meta.label_lower not in _tracked_labels:
+            raise template.TemplateSyntaxError(
+                "'%s' depends on '%s', which is not in DEPENDENCY_MODELS"
+                % (bits[0], label)
+            )
+        models.append(model)
+    nodelist = parser.parse(('end' + bits[0],))
+    parser.delete_first_token()
+    return DependencyCacheNode(
+        nodelist, fragment_name, models,
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
@@ -0,0 +1,162 @@
+from django import template
+from django.utils.html import format_html
+
+from wagtail.images.models import SourceImageIOError
+from wagtail.images.shortcuts import get_rendition_or_not_found
+from wagtail.images.templatetags import wagtailimages_tags
+
+from home.images import (
+    RESPONSIVE_IMAGE_FALLBACK_SPEC, RESPONSIVE_IMAGE_SIZES,
+    get_prefetched_rendition, get_responsive_renditions, get_webp_rendition
+)
+from mysite.instrumentation import timer
+
+register = template.Library()
+
+
+class PrefetchedImageNode(wagtailimages_tags.ImageNode):
+    '''
+    An ImageNode that uses the rendition attached by prefetch_renditions()
+    when there is one, and otherwise looks it up as usual.
+    '''
+    def render(self, context):
+        try:
+            image = self.image_expr.resolve(context)
+        except template.VariableDoesNotExist:
+            return ''
+
+        rendition = get_prefetched_rendition(image, self.filter.spec)
+        if rendition is None:
+            with timer('rendition'):
+                return super().render(context)
+
+        if self.output_var_name:
+            context[self.output_var_name] = rendition
+            return ''
+        resolved_attrs = {}
+        for key in self.attrs:
+            resolved_attrs[key] = self.attrs[key].resolve(context)
+        return rendition.img_tag(resolved_attrs)
+
+
+# Load this library after wagtailimages_tags to replace its {% image %} tag;
+# the syntax is unchanged.
+@register.tag(name='image')
+def image(parser, token):
+    node = wagtailimages_tags.image(parser, token)
+    return PrefetchedImageNode(
+        node.image_expr, node.filter_spec,
+        output_var_name=node.output_var_name, attrs=node.attrs,
+    )
+
+
+class PictureNode(PrefetchedImageNode):
+    '''
+    Renders the image as a <picture> element offering the WebP variant of the
+    rendition, with the rendition itself as the fallback <img>.
+    '''
+    def render(self, context):
+        try:
+            image = self.image_expr.resolve(context)
+        except template.VariableDoesNotExist:
+            return ''
+        img_tag = super().render(context)
+        if not img_tag:
+            return ''
+        try:
+            with timer('rendition'):
+                webp = get_webp_rendition(image, self.filter.spec)
+        except SourceImageIOError:
+            webp = None
+        if webp is None:
+            return img_tag
+        return format_html(
+            '<picture><source srcset="{}" type="image/webp">{}</picture>',
+            webp.url, img_tag
+        )
+
+
+# {% picture image filter-spec [attr="value" ...] %}
+# Browsers pick the format from the markup, so the HTML is the same for every
+# client and can be cached as a whole page.
+@register.tag(name='picture')
+def picture(parser, token):
+    node = wagtailimages_tags.image(parser, token)
+    if node.output_var_name:
+        raise template.TemplateSyntaxError(
+            "'picture' tag does not support the 'as' form"
+        )
+    return PictureNode(node.image_expr, node.filter_spec, attrs=node.attrs)
+
+
+class ResponsiveImageNode(template.Node):
+    def __init__(self, image_expr, attrs):
+        self.image_expr = image_expr
+        self.attrs = attrs
+
+    def render(self, context):
+        try:
+            image = self.image_expr.resolve(context)
+        except template.VariableDoesNotExist:
+            return ''
+        if not image:
+            return ''
+
+        try:
+            with timer('rendition'):
+                renditions = get_responsive_renditions(image)
+                webp_renditions = get_responsive_renditions(image, webp=True)
+        except SourceImageIOError:
+            return get_rendition_or_not_found(
+                image, RESPONSIVE_IMAGE_FALLBACK_SPEC
+            ).img_tag()
+        fallback = get_prefetched_rendition(image, RESPONSIVE_IMAGE_FALLBACK_SPEC) \
+            or image.get_rendition(RESPONSIVE_IMAGE_FALLBACK_SPEC)
+
+        attrs = {
+            'srcset': get_srcset(renditions),
+            'sizes': RESPONSIVE_IMAGE_SIZES,
+            'loading': 'lazy',
+            'decoding': 'async',
+        }
+        for key in self.attrs:
+            attrs[key] = self.attrs[key].resolve(context)
+        # img_tag() adds the fallback's width and height, which lets the
+        # browser reserve the right space before the image loads.
+        img_tag = fallback.img_tag(attrs)
+        if not webp_renditions:
+            return img_tag
+        return format_html(
+            '<picture><source srcset="{}" sizes="{}" type="image/webp">{}</picture>',
+            get_srcset(webp_renditions), attrs['sizes'], img_tag
+        )
+
+
+def get_srcset(renditions):
+    return ', '.join(
+        '{} {}w'.format(rendition.url, rendition.width)
+        for rendition in renditions
+    )
+
+
+# {% responsive_image image [attr="value" ...] %}
+# Renders the image with a srcset of RESPONSIVE_IMAGE_SPECS renditions.
+@register.tag(name='responsive_image')
+def responsive_image(parser, token):
+    bits = token.split_contents()[1:]
+    if not bits:
+        raise template.TemplateSyntaxError(
+            "'responsive_image' tag should be of the form "
+            "{% responsive_image self.photo [ custom-attr=\"value\" ... ] %}"
+        )
+    attrs = {}
+    for bit in bits[1:]:
+        try:
+            name, value = bit.split('=')
+        except ValueError:
+            raise template.TemplateSyntaxError(
+                "'responsive_image' tag only accepts custom-attr=\"value\" "
+                "arguments after the image (given: {})".format(bit)
+            )
+        attrs[name] = parser.compile_filter(value)
+    return ResponsiveImageNode(parser.compile_filter(bits[0]), attrs)
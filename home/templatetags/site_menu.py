@@ -0,0 +1,80 @@
+from functools import lru_cache
+
+from django import template
+from django.core.cache import cache
+from django.db.models import Q
+from django.template.loader import render_to_string
+
+from wagtail.core.models import Site
+from wagtailmenus.models import MainMenu
+
+from mysite.cache import bump_version, get_version
+from mysite.instrumentation import timed
+
+register = template.Library()
+
+
+# Like the footer, the main menu is stored as a compact list of links under a
+# version that is replaced whenever pages or menu items change (see
+# home/signals.py). Only the active state of each link is worked out per
+# request.
+def clear_menu_cache():
+    bump_version('main-menu')
+
+
+def build_menu_items(site):
+    '''
+    Returns (href, text) pairs for the main menu of the given site, applying
+    the same visibility rules as wagtailmenus.
+    '''
+    menu = MainMenu.get_for_site(site)
+    items = menu.menu_items.select_related('link_page').filter(
+        Q(link_page__isnull=True) | Q(
+            link_page__live=True,
+            link_page__expired=False,
+            link_page__show_in_menus=True,
+        )
+    ).order_by('sort_order')
+    links = []
+    for item in items:
+        href = item.relative_url(site)
+        if href:
+            links.append((href, item.menu_text))
+    return links
+
+
+@lru_cache(maxsize=16)
+def get_menu_items(version, site_id):
+    key = 'home:main-menu:%s:%s' % (version, site_id)
+    links = cache.get(key)
+    if links is None:
+        links = build_menu_items(Site.objects.get(pk=site_id))
+        cache.set(key, links, None)
+    return tuple(links)
+
+
+def get_active_class(href, path):
+    if href == path:
+        return 'active'
+    if href != '/' and href.startswith('/') and path.startswith(href):
+        return 'ancestor'
+    return ''
+
+
+@register.simple_tag(takes_context=True)
+@timed('menu')
+def main_menu(context, template='main_menu.html'):
+    request = context.get('request')
+    site = Site.find_for_request(request) if request else None
+    if site is None:
+        return ''
+    path = request.path
+    menu_items = [
+        {
+            'href': href,
+            'text': text,
+            'active_class': get_active_class(href, path),
+        }
+        for href, text in get_menu_items(get_version('main-menu'), site.pk)
+    ]
+    return render_to_string(template, {'menu_items': menu_items})
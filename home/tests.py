@@ -0,0 +1,145 @@
+import random
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from wagtail.core.models import Page, Site
+from wagtailmenus.models import MainMenu, MainMenuItem
+
+from benchmarks.content import make_image
+from benchmarks.querycount import QueryCountTestCase
+from home.models import Footer, HomePage, PendingRendition
+from home.renditions import generate_pending_renditions, generate_renditions
+from home.templatetags.footer import footer
+from mysite.cache import get_version
+from projects.models import ProjectIndexPage
+
+
+class HomePageQueryCountTests(QueryCountTestCase):
+    def test_home_page(self):
+        self.assertConstantQueries('home')
+
+
+class FooterCacheTests(TestCase):
+    def setUp(self):
+        self.page = HomePage.objects.get().add_child(
+            instance=Page(title='About', slug='about')
+        )
+        Footer.objects.create(
+            text='<p><a linktype="page" id="%d">About</a></p>' % self.page.pk
+        )
+
+    def test_links_follow_slug_changes(self):
+        self.assertIn('href="/about/"', footer())
+        self.page.slug = 'about-us'
+        self.page.save_revision().publish()
+        self.assertIn('href="/about-us/"', footer())
+
+    def test_links_follow_moves(self):
+        parent = HomePage.objects.get().add_child(
+            instance=Page(title='Company', slug='company')
+        )
+        self.assertIn('href="/about/"', footer())
+        self.page.move(parent, pos='last-child')
+        self.assertIn('href="/company/about/"', footer())
+
+
+@override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'
+)
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.home = HomePage.objects.get()
+        # Created by the first request otherwise, which clears the cache
+        self.menu = MainMenu.get_for_site(Site.objects.get())
+        self.projects = self.home.add_child(instance=ProjectIndexPage(
+            title='Projects', slug='projects', intro='<p>First intro</p>',
+        ))
+
+    def test_hits_make_no_queries(self):
+        self.client.get('/projects/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/projects/')
+        self.assertContains(response, 'First intro')
+
+    def test_not_modified(self):
+        response = self.client.get('/projects/')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            '/projects/', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/projects/', HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_publish(self):
+        self.client.get('/projects/')
+        self.projects.intro = '<p>Second intro</p>'
+        self.projects.save_revision().publish()
+        self.assertContains(self.client.get('/projects/'), 'Second intro')
+
+    def test_unpublish(self):
+        self.client.get('/projects/')
+        self.projects.unpublish()
+        self.assertEqual(self.client.get('/projects/').status_code, 404)
+
+    def test_move(self):
+        company = self.home.add_child(instance=Page(title='Company', slug='company'))
+        self.client.get('/projects/')
+        self.projects.move(company, pos='last-child')
+        self.assertEqual(self.client.get('/projects/').status_code, 404)
+
+    def test_menu_changes_clear_every_page(self):
+        self.projects.show_in_menus = True
+        self.projects.save_revision().publish()
+        MainMenuItem.objects.create(
+            menu=self.menu, link_page=self.projects, sort_order=0
+        )
+        self.home.add_child(instance=ProjectIndexPage(title='About', slug='about'))
+        self.assertContains(self.client.get('/about/'), '>Projects<')
+
+        self.projects.title = 'Our projects'
+        self.projects.save_revision().publish()
+        self.assertContains(self.client.get('/about/'), '>Our projects<')
+
+        self.projects.show_in_menus = False
+        self.projects.save_revision().publish()
+        self.assertNotContains(self.client.get('/about/'), 'Our projects')
+
+
+class RenditionQueueTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp(prefix='renditions-media-')
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.image = make_image(random.Random(0), 0)
+        PendingRendition.objects.bulk_create([
+            PendingRendition(image_id=self.image.pk),
+            PendingRendition(image_id=self.image.pk),
+            PendingRendition(image_id=self.image.pk + 1),
+        ])
+
+    def test_generates_queued_images(self):
+        self.assertEqual(generate_pending_renditions(), 2)
+        self.assertTrue(self.image.renditions.filter(filter_spec='width-400').exists())
+        self.assertFalse(PendingRendition.objects.exists())
+
+    def test_failed_batches_leave_the_queue(self):
+        with mock.patch('home.renditions.generate_renditions', side_effect=OSError):
+            with self.assertRaises(OSError):
+                generate_pending_renditions()
+        self.assertFalse(PendingRendition.objects.exists())
+
+    def test_new_renditions_clear_cached_bodies(self):
+        version = get_version('page-body')
+        generate_renditions([self.image.pk])
+        self.assertNotEqual(get_version('page-body'), version)
+        # Nothing new the second time
+        version = get_version('page-body')
+        generate_renditions([self.image.pk])
+        self.assertEqual(get_version('page-body'), version)
@@ -0,0 +1,9 @@
+from wagtail.core import hooks
+
+from mysite.instrumentation import set_page_type
+
+
+@hooks.register('before_serve_page')
+def record_page_type(page, request, serve_args, serve_kwargs):
+    # Lets the instrumentation middleware report and budget by page type
+    set_page_type(type(page).__name__)
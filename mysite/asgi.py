@@ -0,0 +1,18 @@
+"""
+ASGI config for mysite project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings.dev")
+# Serve pages and search through the async views (see mysite/async_views.py)
+os.environ.setdefault("ASYNC_VIEWS", "1")
+
+application = get_asgi_application()
@@ -0,0 +1,53 @@
+"""
+Async versions of the views that can keep a client waiting, for use when the
+project is served over ASGI.
+
+Django 3.1 runs sync views under ASGI one at a time on a single shared
+thread, so one slow page would hold up every other request in the worker.
+async_view() instead runs the whole view, including rendering its template
+response, in a thread of its own, leaving the event loop free to serve
+other clients meanwhile. The ORM is only ever used from that thread.
+
+Views are only wrapped when the ASYNC_VIEWS setting is on (mysite/asgi.py
+turns it on); under WSGI they stay plain sync views.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from wagtail.core import views as wagtail_views
+
+from mysite.instrumentation import timer
+
+
+def run_view(view, request, *args, **kwargs):
+    # The thread pool's threads are not request threads, so Django's
+    # request_started/request_finished handlers never tidy up their database
+    # connections; do it here instead.
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            with timer('template'):
+                response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    if not settings.ASYNC_VIEWS:
+        return view
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await sync_to_async(run_view, thread_sensitive=False)(
+            view, request, *args, **kwargs
+        )
+    return wrapper
+
+
+serve = async_view(wagtail_views.serve)
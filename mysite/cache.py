@@ -0,0 +1,21 @@
+"""
+Helpers for cached data that is invalidated by replacing a version stamp
+rather than by deleting every key that depends on it.
+
+Callers build their cache keys (or process-local memo keys) from
+get_version(name) and call bump_version(name) when the underlying data
+changes. A version that has been evicted from the cache is simply replaced
+by a fresh one, which invalidates everything built on it.
+"""
+
+from uuid import uuid4
+
+from django.core.cache import cache
+
+
+def get_version(name):
+    return cache.get_or_set('version:' + name, uuid4().hex, None)
+
+
+def bump_version(name):
+    cache.set('version:' + name, uuid4().hex, None)
@@ -0,0 +1,124 @@
+"""
+Routes public read traffic to the read replicas in DATABASE_REPLICAS.
+
+ReplicaRoutingMiddleware marks anonymous GET and HEAD requests for pages and
+search results as safe to read from a replica; everything else, including
+the admin, every write and any code running outside such a request (search
+hit flushing, management commands), uses the default database.
+
+Replicas lag behind the primary, so reads go back to the primary for a
+while after data changes:
+- pin_to_primary() sends all requests to the primary for REPLICA_LAG_SECONDS.
+  It is called whenever cached pages are invalidated (see page_cache.py), so
+  that the pages re-rendered and cached next are built from fresh data.
+- A browser that has just made a write request (such as an editor
+  publishing a page) gets a cookie that keeps its own requests on the
+  primary for PRIMARY_STICKY_SECONDS, so it reads its own writes.
+"""
+
+import asyncio
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import Resolver404, resolve
+
+# Views whose anonymous reads may be served from a replica, by namespaced
+# URL name so that admin views with the same names are never included
+REPLICA_URL_NAMES = ('wagtail_serve', 'search')
+
+PRIMARY_COOKIE_NAME = 'use_primary'
+PINNED_CACHE_KEY = 'db:primary-pinned-until'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def pin_to_primary():
+    cache.set(
+        PINNED_CACHE_KEY,
+        time.time() + settings.REPLICA_LAG_SECONDS,
+        settings.REPLICA_LAG_SECONDS,
+    )
+
+
+def is_replica_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if (
+        settings.SESSION_COOKIE_NAME in request.COOKIES
+        or PRIMARY_COOKIE_NAME in request.COOKIES
+    ):
+        return False
+    try:
+        if resolve(request.path_info).view_name not in REPLICA_URL_NAMES:
+            return False
+    except Resolver404:
+        return False
+    return (cache.get(PINNED_CACHE_KEY) or 0) < time.time()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if settings.DATABASE_REPLICAS and _use_replica.get():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        token = _use_replica.set(is_replica_request(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        # The flag is copied into the threads that sync_to_async() runs the
+        # views in.
+        token = _use_replica.set(
+            await sync_to_async(is_replica_request)(request)
+        )
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            response.set_cookie(
+                PRIMARY_COOKIE_NAME, '1',
+                max_age=settings.PRIMARY_STICKY_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,207 @@
+"""
+Per-request performance instrumentation.
+
+InstrumentationMiddleware collects, for each request:
+- the number of SQL queries and the time spent in them,
+- the time spent rendering the template response,
+- the time spent in sections wrapped in timer(), such as the footer and main
+  menu tags and rendition lookups that missed the prefetch.
+
+It reports them in a Server-Timing header (when SERVER_TIMING_HEADER is on)
+and as one JSON log line per request on the 'mysite.performance' logger.
+
+Requests are classified by the specific page type being served (set by the
+before_serve_page hook in home/wagtail_hooks.py) or otherwise by URL name.
+When a class has an entry in QUERY_BUDGETS and the request makes more
+queries than that, a warning is logged, or QueryBudgetExceeded is raised if
+QUERY_BUDGET_STRICT is on, as it should be in tests.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger('mysite.performance')
+
+_metrics = ContextVar('request_metrics', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.page_type = None
+        self.query_count = 0
+        # name -> total milliseconds
+        self.timings = {}
+
+    def add(self, name, duration):
+        self.timings[name] = self.timings.get(name, 0) + duration * 1000
+
+
+def set_page_type(page_type):
+    metrics = _metrics.get()
+    if metrics is not None:
+        metrics.page_type = page_type
+
+
+@contextmanager
+def timer(name):
+    '''
+    Adds the time spent in the block to the current request's timings under
+    name. Does nothing outside an instrumented request.
+    '''
+    metrics = _metrics.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, time.perf_counter() - started)
+
+
+def timed(name):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count_queries(execute, sql, params, many, context):
+    metrics = _metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.query_count += 1
+        metrics.add('db', time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    # Installed on every connection, whichever thread opens it, so queries
+    # made from the threads that async views run in are counted too.
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+def install_on_current_connections():
+    # For connections opened before this module was imported
+    for connection in connections.all():
+        install_query_counter(None, connection)
+
+
+def get_request_class(request, metrics):
+    if metrics.page_type:
+        return metrics.page_type
+    try:
+        return resolve(request.path_info).view_name
+    except Resolver404:
+        return None
+
+
+def get_server_timing(metrics, total):
+    entries = ['total;dur=%.1f' % total]
+    entries.append('db;dur=%.1f;desc="%d queries"' % (
+        metrics.timings.get('db', 0), metrics.query_count
+    ))
+    for name, duration in sorted(metrics.timings.items()):
+        if name != 'db':
+            entries.append('%s;dur=%.1f' % (name, duration))
+    return ', '.join(entries)
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        install_on_current_connections()
+        metrics = RequestMetrics()
+        token = _metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _metrics.reset(token)
+        self.report(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _metrics.reset(token)
+        await sync_to_async(self.report)(request, response, metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        # Called just before Django renders the response
+        metrics = _metrics.get()
+        if metrics is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda response: metrics.add(
+                    'template', time.perf_counter() - started
+                )
+            )
+        return response
+
+    def report(self, request, response, metrics):
+        total = (time.perf_counter() - metrics.started) * 1000
+        request_class = get_request_class(request, metrics)
+
+        if getattr(settings, 'SERVER_TIMING_HEADER', False):
+            response['Server-Timing'] = get_server_timing(metrics, total)
+
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'class': request_class,
+            'duration_ms': round(total, 1),
+            'queries': metrics.query_count,
+            'timings_ms': {
+                name: round(duration, 1)
+                for name, duration in sorted(metrics.timings.items())
+            },
+        }))
+
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(request_class)
+        if budget is not None and metrics.query_count > budget:
+            message = '%s %s made %d queries, over the %s budget of %d' % (
+                request.method, request.path, metrics.query_count,
+                request_class, budget,
+            )
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
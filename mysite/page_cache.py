@@ -0,0 +1,150 @@
+"""
+Full-page response cache for Wagtail page serving.
+
+PageCacheMiddleware stores the responses Wagtail serves to anonymous GET
+requests and answers later requests for the same site, path and listing
+parameters straight from the cache, before URL routing, so a hit does no
+database work at all.
+
+Entries are keyed on a version per URL path plus a global version.
+clear_page() bumps the versions of a page's own path, its ancestors (the
+index pages that list it) and the tag listing pages when it is published
+or unpublished. clear_all() bumps the global version for changes that can
+show up on every page, such as the footer or the menu. Both are called
+from the signal handlers in home/signals.py.
+"""
+
+import asyncio
+from hashlib import md5
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from mysite.cache import bump_version, get_version
+from mysite.db_routers import pin_to_primary
+
+# Query parameters that change what a page renders. Any others are ignored.
+CACHED_QUERY_PARAMS = ('page', 'tag', 'after', 'before')
+
+
+def get_cache_key(request):
+    params = '&'.join(
+        '{}={}'.format(name, value)
+        for name in CACHED_QUERY_PARAMS
+        for value in request.GET.getlist(name)
+    )
+    return 'page-cache:{}:{}:{}:{}'.format(
+        get_version('pages'),
+        get_version('page:' + request.path),
+        request.get_host(),
+        md5((request.path + '?' + params).encode()).hexdigest(),
+    )
+
+
+def clear_page(page):
+    '''
+    Invalidates the cached responses of the given page, its ancestors and
+    the blog tag listing pages.
+    '''
+    from blog.models import BlogTagIndexPage
+
+    pages = list(page.get_ancestors(inclusive=True))
+    pages += BlogTagIndexPage.objects.live()
+    # Re-render from the primary until the replicas have caught up, so that
+    # stale pages are not cached again.
+    pin_to_primary()
+    for page in pages:
+        url_parts = page.get_url_parts()
+        if url_parts:
+            bump_version('page:' + url_parts[2])
+
+
+def clear_all():
+    '''
+    Invalidates every cached page response.
+    '''
+    pin_to_primary()
+    bump_version('pages')
+
+
+def is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # Anyone who has a session may be logged in, may see the user bar or a
+    # page behind a password, and so always gets a fresh response.
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return False
+    try:
+        return resolve(request.path_info).url_name == 'wagtail_serve'
+    except Resolver404:
+        return False
+
+
+def is_cacheable_response(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_USED')
+        and 'private' not in response.get('Cache-Control', '')
+        and 'no-cache' not in response.get('Cache-Control', '')
+    )
+
+
+class PageCacheMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Mark the instance as a coroutine function, as Django does for
+            # its own middleware, so that it is called in async mode.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not is_cacheable_request(request):
+            return self.get_response(request)
+
+        key = get_cache_key(request)
+        response = self.get_cached_response(request, key)
+        if response is None:
+            response = self.get_response(request)
+            self.store_response(request, key, response)
+        return response
+
+    async def __acall__(self, request):
+        if not await sync_to_async(is_cacheable_request)(request):
+            return await self.get_response(request)
+
+        key = await sync_to_async(get_cache_key)(request)
+        response = await sync_to_async(self.get_cached_response)(request, key)
+        if response is None:
+            response = await self.get_response(request)
+            await sync_to_async(self.store_response)(request, key, response)
+        return response
+
+    def get_cached_response(self, request, key):
+        response = cache.get(key)
+        if response is not None:
+            return get_conditional_response(
+                request,
+                etag=response['ETag'],
+                last_modified=parse_http_date_safe(response['Last-Modified']),
+                response=response,
+            )
+
+    def store_response(self, request, key, response):
+        if is_cacheable_response(request, response):
+            response['ETag'] = quote_etag(md5(response.content).hexdigest())
+            response['Last-Modified'] = http_date()
+            cache.set(
+                key, response,
+                getattr(settings, 'PAGE_CACHE_TIMEOUT', 600)
+            )
@@ -2,6 +2,61 @@ from .base import *
 
 DEBUG = False
 
+# Keep each worker's database connections open between requests, for
+# CONN_MAX_AGE seconds (default 60). Not under ASGI, where queries run in
+# pooled threads that Django's per-request connection cleanup does not
+# reliably reach, so kept connections would pile up.
+if ASYNC_VIEWS:
+    CONN_MAX_AGE = 0
+else:
+    CONN_MAX_AGE = int(os.environ.get('CONN_MAX_AGE', 60))
+for database in DATABASES.values():
+    database['CONN_MAX_AGE'] = CONN_MAX_AGE
+
+# Timings reveal how the site works internally; only send them when asked to
+SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER') == '1'
+
+# Compile each template once per process rather than on every render.
+# Django only does this by default when DEBUG is off and no loaders are set,
+# so it is spelled out here.
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+# The page, footer and search caches are invalidated from whichever process
+# handles a publish, so production needs a cache shared by all workers.
+#
+# The default file-based cache is only shared by the workers of one
+# container. When the site runs in more than one container (or the admin
+# runs in its own), set CACHE_BACKEND and CACHE_LOCATION to a shared cache,
+# e.g. django.core.cache.backends.memcached.PyLibMCCache and host:11211;
+# otherwise invalidations never reach the other containers, and the footer
+# and menu, which are cached until they change, stay stale there.
+#
+# CACHE_MAX_ENTRIES caps the number of entries in the file-based cache; past
+# it a third of them are culled at random, whichever cache (pages, bodies,
+# fragments) they belong to. Size it to hold every page of the site several
+# times over.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.environ.get(
+            'CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')
+        ),
+    }
+}
+if CACHES['default']['BACKEND'].endswith('.FileBasedCache'):
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 20000)),
+    }
+
 try:
     from .local import *
 except ImportError:
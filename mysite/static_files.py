@@ -0,0 +1,44 @@
+"""
+Serves the collected static files from the application process.
+
+StaticFilesMiddleware is WhiteNoise's middleware, made usable from both the
+WSGI and the ASGI handler. It comes first in MIDDLEWARE, so a static file
+request is answered from an in-memory index of STATIC_ROOT without running
+any other middleware, view, template or query.
+
+In production, CompressedManifestStaticFilesStorage writes gzip and brotli
+copies of each file at collectstatic time and the middleware picks one by
+Accept-Encoding. Files with a content hash in their name are sent with a
+far-future "immutable" Cache-Control header. Responses are FileResponses,
+which Gunicorn's sync and gthread workers send with sendfile().
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # Looks for the file on disk (DEBUG only)
+            response = await sync_to_async(self.process_request)(request)
+        else:
+            response = self.process_request(request)
+        if response is None:
+            response = await self.get_response(request)
+        return response
@@ -1,11 +1,12 @@
 from django.conf import settings
-from django.urls import include, path
+from django.urls import include, path, re_path
 from django.contrib import admin
 
 from wagtail.admin import urls as wagtailadmin_urls
 from wagtail.core import urls as wagtail_urls
 from wagtail.documents import urls as wagtaildocs_urls
 
+from mysite import async_views
 from search import views as search_views
 
 urlpatterns = [
@@ -28,6 +29,14 @@ if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 urlpatterns = urlpatterns + [
+    # Page serving through the async wrapper when ASYNC_VIEWS is on, under
+    # the same pattern and name as Wagtail's own, leaving its _util/ views
+    # to the include below.
+    re_path(
+        '^(?!_util/)' + wagtail_urls.serve_pattern[1:],
+        async_views.serve, name='wagtail_serve'
+    ),
+
     # For anything not caught by a more specific rule above, hand over to
     # Wagtail's page serving mechanism. This should be the last pattern in
     # the list:
@@ -0,0 +1,37 @@
+"""
+Fills the caches that the first requests would otherwise have to build.
+
+Called by the gunicorn config when the server starts. With preload_app on,
+this runs in the master process before the workers are forked, so the
+process-local caches it fills are shared by every worker.
+"""
+
+import logging
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up():
+    from wagtail.core.models import Site
+
+    from blog.models import BlogIndexPage
+    from home.renditions import get_filter_specs
+    from home.templatetags.footer import render_footer
+    from home.templatetags.site_menu import get_menu_items
+    from mysite.cache import get_version
+
+    try:
+        Site.get_site_root_paths()
+        get_filter_specs()
+        BlogIndexPage.get_all_tags()
+        render_footer(get_version('footer'))
+        for site in Site.objects.all():
+            get_menu_items(get_version('main-menu'), site.pk)
+    except Exception:
+        # A cold cache is only slower, so never stop the server over it
+        logger.exception('Cache warm-up failed')
+    finally:
+        # Forked workers must not share the master's database connections
+        connections.close_all()
@@ -7,10 +7,12 @@ from wagtail.admin.edit_handlers import FieldPanel, StreamFieldPanel
 from wagtail.images.edit_handlers import ImageChooserPanel
 from wagtail.search import index
 from wagtail.core.fields import StreamField
-from wagtail.images.blocks import ImageChooserBlock
 
 from modelcluster.fields import ParentalKey
 
+from home.blocks import ResponsiveImageBlock
+from home.mixins import RenderedBodyMixin
+
 
 class ProjectIndexPage(Page):
     intro = RichTextField(blank=True)
@@ -21,18 +23,19 @@ class ProjectIndexPage(Page):
 
     def get_context(self, request):
         context = super().get_context(request)
-        projects = self.get_children().live().order_by('-first_published_at')
+        projects = self.get_children().live().specific() \
+            .order_by('-first_published_at')
         context['projects'] = projects
         return context
 
 
-class ProjectPage(Page):
+class ProjectPage(RenderedBodyMixin, Page):
     date = models.DateField('Project date')
     intro = models.CharField(max_length=250)
     body = StreamField([
         ('heading', blocks.CharBlock(form_classname='full title')),
         ('paragraph', blocks.RichTextBlock()),
-        ('image', ImageChooserBlock()),
+        ('image', ResponsiveImageBlock()),
     ])
 
     search_fields = Page.search_fields + [
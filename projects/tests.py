@@ -1,3 +1,9 @@
-from django.test import TestCase
+from benchmarks.querycount import QueryCountTestCase
 
-# Create your tests here.
+
+class ProjectQueryCountTests(QueryCountTestCase):
+    def test_index_page(self):
+        self.assertConstantQueries('project_index')
+
+    def test_project_page(self):
+        self.assertConstantQueries('project')
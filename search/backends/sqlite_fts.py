@@ -0,0 +1,511 @@
+"""
+Full-text search backend using an SQLite FTS5 index.
+
+Every indexed object gets an IndexEntry and a row in the search_fts virtual
+table (created by search/migrations/0001_initial.py) holding its title and
+the text of all its other index.SearchField declarations, so matching and
+bm25 ranking are done by the FTS5 index rather than by icontains scans. Wagtail's search
+signal handlers keep the index up to date as objects are saved and deleted.
+
+On databases other than SQLite, or an SQLite build without FTS5, the
+backend behaves exactly like Wagtail's database backend. It also does so
+until the index has been built once by `reindex_pages` or `update_index`,
+as the table created by the migration starts out empty.
+"""
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, connections, router
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape, strip_tags
+from django.utils.safestring import mark_safe
+
+from wagtail.search import index
+from wagtail.search.backends.base import BaseSearchResults
+from wagtail.search.backends.db import (
+    MATCH_ALL, MATCH_NONE, DatabaseSearchBackend, DatabaseSearchQueryCompiler
+)
+from wagtail.search.query import And, Boost, MatchAll, Not, Or, Phrase, PlainText
+
+from search.models import IndexBuild, IndexEntry
+
+TABLE = 'search_fts'
+
+# Markers wrapped around matched terms by snippet(). They cannot occur in
+# indexed text, so the snippet can be escaped before they are turned into
+# <mark> tags.
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+_fts_available = False
+
+
+def fts_table_exists():
+    return (
+        connection.vendor == 'sqlite'
+        and TABLE in connection.introspection.table_names()
+    )
+
+
+def fts_available():
+    '''
+    Returns whether searches can use the index: its table exists and it has
+    been fully built at least once.
+    '''
+    # Only a positive answer is remembered, so the index starts being used
+    # as soon as it has been built.
+    global _fts_available
+    if not _fts_available:
+        _fts_available = (
+            fts_table_exists()
+            and IndexBuild.objects.using(router.db_for_read(IndexBuild)).exists()
+        )
+    return _fts_available
+
+
+def read_connection():
+    '''
+    Returns the connection that index queries should read from, which may
+    be a replica (see mysite/db_routers.py).
+    '''
+    return connections[router.db_for_read(IndexEntry)]
+
+
+def match_sql(columns, extra=''):
+    '''
+    Returns SQL selecting the given columns for the index entries of one
+    content type matching an FTS5 expression. Takes the expression and the
+    content type as parameters, in that order.
+    '''
+    return (
+        'SELECT {columns} FROM {table} '
+        'INNER JOIN {entries} ON {entries}.id = {table}.rowid '
+        'WHERE {table} MATCH %s AND {entries}.content_type = %s {extra}'
+        .format(
+            columns=columns, table=TABLE,
+            entries=IndexEntry._meta.db_table, extra=extra,
+        )
+    )
+
+
+def get_model_root(model):
+    '''
+    Returns the topmost concrete parent of model, e.g. Page for BlogPage.
+    Objects are indexed under their root model so that a search on Page
+    finds pages of every type, as they all share the root's primary keys.
+    '''
+    while model._meta.parents:
+        model = next(iter(model._meta.parents))
+    return model
+
+
+def get_document(obj):
+    '''
+    Returns the (title, body) text to be indexed for obj, built from the
+    model's index.SearchField declarations.
+    '''
+    title, body = [], []
+    for field in obj.get_search_fields():
+        if not isinstance(field, index.SearchField):
+            continue
+        value = field.get_value(obj)
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ' '.join(str(item) for item in value)
+        text = strip_tags(str(value))
+        if field.field_name == 'title':
+            title.append(text)
+        else:
+            body.append(text)
+    return ' '.join(title), ' '.join(body)
+
+
+class SQLiteFTSIndex:
+    name = TABLE
+
+    def add_model(self, model):
+        pass  # All models share the one table
+
+    def refresh(self):
+        pass  # Changes are visible immediately
+
+    def reset(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {}'.format(TABLE))
+        IndexEntry.objects.all().delete()
+        IndexBuild.objects.all().delete()
+
+    def mark_built(self):
+        '''
+        Records that every indexed object has been added, so that searches
+        start using the index.
+        '''
+        IndexBuild.objects.update_or_create(pk=1, defaults={})
+
+    def add_item(self, item):
+        self.add_items(type(item), [item])
+
+    def add_items(self, model, items):
+        self.add_rows(get_model_root(model)._meta.label_lower, [
+            (item.pk,) + get_document(item) for item in items
+        ])
+
+    def add_rows(self, content_type, rows):
+        '''
+        Indexes (object_id, title, body) rows for objects of the given
+        content type, replacing any existing text for the same objects.
+        '''
+        if not rows:
+            return
+        object_ids = [row[0] for row in rows]
+        IndexEntry.objects.bulk_create(
+            [
+                IndexEntry(content_type=content_type, object_id=object_id)
+                for object_id in object_ids
+            ],
+            ignore_conflicts=True,
+        )
+        entry_ids = dict(
+            IndexEntry.objects
+            .filter(content_type=content_type, object_id__in=object_ids)
+            .values_list('object_id', 'id')
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'DELETE FROM {} WHERE rowid = %s'.format(TABLE),
+                [(entry_ids[object_id],) for object_id in object_ids]
+            )
+            cursor.executemany(
+                'INSERT INTO {} (rowid, title, body) VALUES (%s, %s, %s)'.format(TABLE),
+                [(entry_ids[object_id], title, body) for object_id, title, body in rows]
+            )
+
+    def prune(self, content_type, object_ids):
+        '''
+        Removes the entries of the given content type for objects not in
+        object_ids, returning how many were removed.
+        '''
+        stale = [
+            entry_id for entry_id, object_id in
+            IndexEntry.objects.filter(content_type=content_type)
+            .values_list('id', 'object_id').iterator()
+            if object_id not in object_ids
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'DELETE FROM {} WHERE rowid = %s'.format(TABLE),
+                [(entry_id,) for entry_id in stale]
+            )
+        # Deleted in batches to stay under SQLite's limit on parameters
+        for start in range(0, len(stale), 500):
+            IndexEntry.objects.filter(id__in=stale[start:start + 500]).delete()
+        return len(stale)
+
+    def delete_item(self, item):
+        entries = IndexEntry.objects.filter(
+            content_type=get_model_root(type(item))._meta.label_lower,
+            object_id=item.pk,
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'DELETE FROM {} WHERE rowid = %s'.format(TABLE),
+                [(entry_id,) for entry_id in entries.values_list('id', flat=True)]
+            )
+        entries.delete()
+
+
+class SQLiteFTSRebuilder:
+    def __init__(self, index):
+        self.index = index
+
+    def start(self):
+        self.index.reset()
+        return self.index
+
+    def finish(self):
+        self.index.mark_built()
+
+
+class SQLiteFTSQueryCompiler(DatabaseSearchQueryCompiler):
+
+    def get_match(self):
+        '''
+        Returns (negated, expression) for the query, where expression is an
+        FTS5 MATCH expression, MATCH_ALL or MATCH_NONE, and negated means
+        that the query matches the objects the expression does not.
+        '''
+        negated, expression = self._build_expression(self.query)
+        if self.fields and expression not in (MATCH_ALL, MATCH_NONE):
+            columns = {
+                'title' if field == 'title' else 'body' for field in self.fields
+            }
+            if len(columns) == 1:
+                expression = '{} : ({})'.format(columns.pop(), expression)
+        return negated, expression
+
+    def _quote(self, text):
+        return '"{}"'.format(text.replace('"', '""'))
+
+    def _negate(self, negated, expression):
+        if expression == MATCH_ALL:
+            return False, MATCH_NONE if not negated else MATCH_ALL
+        if expression == MATCH_NONE:
+            return False, MATCH_ALL if not negated else MATCH_NONE
+        return not negated, expression
+
+    def _and(self, parts):
+        # FTS5's NOT is binary, so negated parts are subtracted from the
+        # others; if there are none, the union of the negated parts is
+        # returned negated.
+        included = [expression for negated, expression in parts if not negated]
+        excluded = [expression for negated, expression in parts if negated]
+        if MATCH_NONE in included or MATCH_ALL in excluded:
+            return False, MATCH_NONE
+        included = [expression for expression in included if expression != MATCH_ALL]
+        excluded = [expression for expression in excluded if expression != MATCH_NONE]
+        if not excluded:
+            if not included:
+                return False, MATCH_ALL
+            return False, ' AND '.join('({})'.format(e) for e in included)
+        excluded = ' OR '.join('({})'.format(e) for e in excluded)
+        if not included:
+            return True, excluded
+        return False, '({}) NOT ({})'.format(
+            ' AND '.join('({})'.format(e) for e in included), excluded
+        )
+
+    def _build_expression(self, query):
+        if isinstance(query, PlainText):
+            terms = [
+                self._quote(term) + ('*' if self.partial_match else '')
+                for term in query.query_string.split()
+            ]
+            if not terms:
+                return False, MATCH_NONE
+            operator = ' OR ' if query.operator == 'or' else ' AND '
+            return False, operator.join(terms)
+
+        if isinstance(query, Phrase):
+            if not query.query_string.strip():
+                return False, MATCH_NONE
+            return False, self._quote(query.query_string)
+
+        if isinstance(query, Boost):
+            return self._build_expression(query.subquery)
+
+        if isinstance(query, MatchAll):
+            return False, MATCH_ALL
+
+        if isinstance(query, Not):
+            return self._negate(*self._build_expression(query.subquery))
+
+        if isinstance(query, And):
+            return self._and([
+                self._build_expression(subquery) for subquery in query.subqueries
+            ])
+
+        if isinstance(query, Or):
+            # a OR b is NOT (NOT a AND NOT b)
+            return self._negate(*self._and([
+                self._negate(*self._build_expression(subquery))
+                for subquery in query.subqueries
+            ]))
+
+        raise NotImplementedError(
+            '`%s` is not supported by the SQLite FTS search backend.'
+            % query.__class__.__name__)
+
+    def get_title_weight(self):
+        for field in self.queryset.model.get_search_fields():
+            if isinstance(field, index.SearchField) and field.field_name == 'title':
+                return float(field.boost or 1)
+        return 1.0
+
+
+class SQLiteFTSSearchResults(BaseSearchResults):
+    def _match_params(self, expression):
+        return [
+            expression,
+            get_model_root(self.query_compiler.queryset.model)._meta.label_lower,
+        ]
+
+    def _filtered_queryset(self, negated, expression):
+        # The queryset restricted to matching objects, so that its own
+        # filters (live() etc) still apply.
+        queryset = self.query_compiler.queryset
+        if expression == MATCH_ALL:
+            return queryset
+        matches = RawSQL(match_sql('object_id'), self._match_params(expression))
+        if negated:
+            return queryset.exclude(pk__in=matches)
+        return queryset.filter(pk__in=matches)
+
+    def _is_ranked(self, negated, expression):
+        # Only positive text matches have a bm25 score
+        return (
+            self.query_compiler.order_by_relevance
+            and not negated and expression != MATCH_ALL
+        )
+
+    def _allowed_match_sql(self, expression, columns, extra=''):
+        '''
+        Returns the SQL and parameters selecting the given columns for the
+        matches that the queryset allows, which is checked by SQLite in a
+        subquery rather than by loading the queryset's ids.
+        '''
+        queryset = self.query_compiler.queryset.order_by().values('pk')
+        allowed_sql, allowed_params = queryset.query.get_compiler(
+            connection=read_connection()
+        ).as_sql()
+        sql = match_sql(
+            columns, 'AND object_id IN ({}) {}'.format(allowed_sql, extra)
+        )
+        return sql, self._match_params(expression) + list(allowed_params)
+
+    def _ranked_ids(self, expression):
+        '''
+        Returns [(id, score)] for the matches allowed by the queryset between
+        start and stop, best match first.
+        '''
+        weight = self.query_compiler.get_title_weight()
+        try:
+            sql, params = self._allowed_match_sql(
+                expression,
+                'object_id, bm25({}, {}, 1.0) AS score'.format(TABLE, weight),
+                'ORDER BY score LIMIT %s OFFSET %s'
+            )
+        except EmptyResultSet:
+            return []
+        # A negative LIMIT means no limit in SQLite
+        limit = -1 if self.stop is None else self.stop - self.start
+        with read_connection().cursor() as cursor:
+            cursor.execute(sql, params + [limit, self.start])
+            ranked = cursor.fetchall()
+        # bm25() scores are negative, with the best match lowest
+        return [(pk, -score) for pk, score in ranked]
+
+    def _do_search(self):
+        negated, expression = self.query_compiler.get_match()
+        if expression == MATCH_NONE:
+            return []
+
+        if not self._is_ranked(negated, expression):
+            results = list(
+                self._filtered_queryset(negated, expression)[self.start:self.stop]
+            )
+            if self._score_field:
+                for obj in results:
+                    setattr(obj, self._score_field, None)
+            return results
+
+        ranked = self._ranked_ids(expression)
+        objects = self.query_compiler.queryset.in_bulk([pk for pk, _ in ranked])
+        results = []
+        for pk, score in ranked:
+            obj = objects.get(pk)
+            if obj is not None:
+                if self._score_field:
+                    setattr(obj, self._score_field, score)
+                results.append(obj)
+        return results
+
+    def _do_count(self):
+        negated, expression = self.query_compiler.get_match()
+        if expression == MATCH_NONE:
+            return 0
+
+        if not self._is_ranked(negated, expression):
+            return self._filtered_queryset(negated, expression)[self.start:self.stop].count()
+
+        try:
+            sql, params = self._allowed_match_sql(expression, 'COUNT(*)')
+        except EmptyResultSet:
+            return 0
+        with read_connection().cursor() as cursor:
+            cursor.execute(sql, params)
+            count = cursor.fetchone()[0]
+        if self.stop is not None:
+            count = min(count, self.stop)
+        return max(count - self.start, 0)
+
+
+class SQLiteFTSSearchBackend(DatabaseSearchBackend):
+    query_compiler_class = SQLiteFTSQueryCompiler
+    results_class = SQLiteFTSSearchResults
+    rebuilder_class = SQLiteFTSRebuilder
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.params = params
+        self.index = SQLiteFTSIndex()
+
+    def get_index_for_model(self, model):
+        return self.index
+
+    def reset_index(self):
+        if fts_table_exists():
+            self.index.reset()
+
+    def add_type(self, model):
+        pass  # All models share the one table
+
+    def refresh_index(self):
+        pass  # Changes are visible immediately
+
+    def add(self, obj):
+        if fts_table_exists():
+            self.index.add_item(obj)
+
+    def add_bulk(self, model, obj_list):
+        if fts_table_exists():
+            self.index.add_items(model, obj_list)
+
+    def delete(self, obj):
+        if fts_table_exists():
+            self.index.delete_item(obj)
+
+    def search(self, *args, **kwargs):
+        if not fts_available():
+            return DatabaseSearchBackend(self.params).search(*args, **kwargs)
+        return super().search(*args, **kwargs)
+
+    def highlight(self, query_string, objects, length=24):
+        '''
+        Sets a search_snippet attribute on each of the given objects: an
+        excerpt of its indexed body text around the terms matching
+        query_string, with those terms wrapped in <mark> tags.
+        '''
+        objects = list(objects)
+        for obj in objects:
+            obj.search_snippet = ''
+        if not objects or not fts_available():
+            return objects
+
+        model = type(objects[0])
+        compiler = self.query_compiler_class(model.objects.none(), query_string)
+        negated, expression = compiler.get_match()
+        if negated or expression in (MATCH_ALL, MATCH_NONE):
+            return objects
+        with read_connection().cursor() as cursor:
+            cursor.execute(
+                match_sql(
+                    'object_id, snippet({}, 1, %s, %s, %s, %s)'.format(TABLE),
+                    'AND object_id IN ({})'.format(', '.join(['%s'] * len(objects)))
+                ),
+                [HIGHLIGHT_START, HIGHLIGHT_END, '…', length,
+                 expression,
+                 get_model_root(model)._meta.label_lower]
+                + [obj.pk for obj in objects]
+            )
+            snippets = dict(cursor.fetchall())
+
+        for obj in objects:
+            snippet = escape(snippets.get(obj.pk, ''))
+            obj.search_snippet = mark_safe(
+                snippet.replace(HIGHLIGHT_START, '<mark>')
+                .replace(HIGHLIGHT_END, '</mark>')
+            )
+        return objects
+
+
+SearchBackend = SQLiteFTSSearchBackend
@@ -0,0 +1,161 @@
+"""
+Buffered recording of search query hits.
+
+Wagtail's Query.add_hit() does a get-or-create and an UPDATE for every
+search. Instead, hits are counted in memory and written in bulk by a
+background thread every SEARCH_HIT_FLUSH_INTERVAL seconds (and once more
+when the process exits), so the search view itself never writes to the
+database.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from wagtail.search.models import Query, QueryDailyHits
+from wagtail.search.utils import normalise_query_string
+
+logger = logging.getLogger(__name__)
+
+# Hits for a query that could not be written this many flushes in a row are
+# dropped, so that one unwritable query cannot stop all hit recording.
+MAX_FLUSH_ATTEMPTS = 3
+
+_lock = threading.Lock()
+_pending = Counter()
+_failed_flushes = Counter()
+_flusher_pid = None
+
+
+def record_hit(query_string):
+    '''
+    Counts a hit for query_string, to be written by the next flush.
+    '''
+    key = (timezone.now().date(), normalise_query_string(query_string))
+    with _lock:
+        _pending[key] += 1
+    _ensure_flusher()
+
+
+def flush_hits():
+    '''
+    Writes all buffered hits to the database, creating any missing Query and
+    QueryDailyHits rows in bulk. If the bulk write fails, the hits for each
+    query are written separately; those that still fail are put back to be
+    retried by the next flush, up to MAX_FLUSH_ATTEMPTS times.
+    '''
+    global _pending
+    with _lock:
+        pending, _pending = _pending, Counter()
+    if not pending:
+        return
+
+    try:
+        _write_hits(pending)
+    except Exception:
+        logger.exception('Could not write buffered search hits in bulk')
+        failed = _write_hits_separately(pending)
+    else:
+        failed = Counter()
+
+    with _lock:
+        for key in pending:
+            if key not in failed:
+                _failed_flushes.pop(key, None)
+        for key, count in failed.items():
+            _failed_flushes[key] += 1
+            if _failed_flushes[key] >= MAX_FLUSH_ATTEMPTS:
+                del _failed_flushes[key]
+                logger.error(
+                    'Dropped %d search hits for %r after %d failed writes',
+                    count, key[1], MAX_FLUSH_ATTEMPTS
+                )
+            else:
+                _pending[key] += count
+
+
+def _write_hits_separately(pending):
+    '''
+    Writes the hits for each (date, query string) on its own, returning the
+    hits that could not be written.
+    '''
+    failed = Counter()
+    for key, count in pending.items():
+        try:
+            _write_hits(Counter({key: count}))
+        except Exception:
+            logger.exception('Could not write search hits for %r', key[1])
+            failed[key] = count
+    return failed
+
+
+def _write_hits(pending):
+    query_strings = {query_string for _, query_string in pending}
+    with transaction.atomic():
+        Query.objects.bulk_create(
+            [Query(query_string=query_string) for query_string in query_strings],
+            ignore_conflicts=True,
+        )
+        query_ids = dict(
+            Query.objects.filter(query_string__in=query_strings)
+            .values_list('query_string', 'id')
+        )
+        hits = {
+            (query_ids[query_string], date): count
+            for (date, query_string), count in pending.items()
+        }
+
+        # Other processes flush the same (query, date) rows, so the rows are
+        # created with no hits, ignoring any that already exist, and every
+        # count is then added with an atomic UPDATE.
+        QueryDailyHits.objects.bulk_create(
+            [
+                QueryDailyHits(query_id=query_id, date=date, hits=0)
+                for query_id, date in hits
+            ],
+            ignore_conflicts=True,
+        )
+        for (query_id, date), count in hits.items():
+            QueryDailyHits.objects.filter(query_id=query_id, date=date) \
+                .update(hits=F('hits') + count)
+
+
+def _ensure_flusher():
+    # Checking the pid rather than a flag restarts the thread in processes
+    # forked after it was started, e.g. gunicorn workers.
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_periodically, daemon=True).start()
+
+
+def _flush_periodically():
+    interval = getattr(settings, 'SEARCH_HIT_FLUSH_INTERVAL', 30)
+    while True:
+        time.sleep(interval)
+        _flush_safely()
+
+
+def _flush_safely():
+    try:
+        close_old_connections()
+        flush_hits()
+    except Exception:
+        logger.exception('Could not write buffered search hits')
+    finally:
+        close_old_connections()
+
+
+atexit.register(_flush_safely)
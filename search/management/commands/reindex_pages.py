@@ -0,0 +1,225 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.utils.html import strip_tags
+
+from wagtail.core.models import Page
+from wagtail.search import index
+from wagtail.search.backends import get_search_backend
+
+from search.backends.sqlite_fts import (
+    SQLiteFTSSearchBackend, fts_table_exists, get_model_root
+)
+from search.models import IndexBuild
+
+# Only these StreamField blocks carry text worth indexing
+TEXT_BLOCK_TYPES = ('heading', 'paragraph')
+
+
+def extract_rows(rows):
+    '''
+    Turns (pk, title, [field values]) tuples, where StreamField values have
+    been reduced to lists of (block type, raw value) pairs, into the
+    (object_id, title, body) rows stored in the index.
+    Runs in the worker processes, so it must not touch the database.
+    '''
+    documents = []
+    for pk, title, values in rows:
+        text = []
+        for value in values:
+            if isinstance(value, list):
+                text.extend(
+                    strip_tags(block_value) for block_type, block_value in value
+                    if block_type in TEXT_BLOCK_TYPES and block_value
+                )
+            elif value:
+                text.append(strip_tags(str(value)))
+        documents.append((pk, title, ' '.join(text)))
+    return documents
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the search index for every searchable page type, streaming '
+        'pages from the database in chunks and removing entries for pages '
+        'that no longer exist.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Number of pages read and written per batch.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=0,
+            help='Extract text in this many worker processes (default: none).',
+        )
+        parser.add_argument(
+            '--if-not-built', action='store_true',
+            help='Do nothing if the index has already been built.',
+        )
+
+    def handle(self, **options):
+        backend = get_search_backend()
+        if options['if_not_built'] and IndexBuild.objects.exists():
+            return
+        if not isinstance(backend, SQLiteFTSSearchBackend) or not fts_table_exists():
+            self.stdout.write(
+                'The search backend has no FTS5 index; indexing full page '
+                'objects through the backend instead.'
+            )
+            for model in self.get_models():
+                self.reindex_objects(backend, model, options['chunk_size'])
+            IndexBuild.objects.update_or_create(pk=1, defaults={})
+            return
+
+        executor = None
+        if options['workers']:
+            # Worker processes are forked, so they must not inherit open
+            # database connections.
+            connections.close_all()
+            executor = ProcessPoolExecutor(options['workers'])
+        indexed = set()
+        try:
+            for model in self.get_models():
+                if self.can_stream(model):
+                    indexed |= self.reindex_model(
+                        backend.index, model, options['chunk_size'], executor,
+                        options['workers'] * 2
+                    )
+                else:
+                    indexed |= self.reindex_objects(
+                        backend, model, options['chunk_size']
+                    )
+        finally:
+            if executor:
+                executor.shutdown()
+        with transaction.atomic():
+            removed = backend.index.prune(
+                Page._meta.label_lower, indexed
+            )
+        if removed:
+            self.stdout.write('Removed {} deleted pages'.format(removed))
+        backend.index.mark_built()
+
+    def get_models(self):
+        return [
+            model for model in index.get_indexed_models()
+            if issubclass(model, Page)
+        ]
+
+    def can_stream(self, model):
+        '''
+        Returns whether all the searchable fields of model are database
+        columns, which chunks() can read without loading page objects.
+        '''
+        for field_name in self.get_field_names(model):
+            try:
+                field = model._meta.get_field(field_name)
+            except FieldDoesNotExist:
+                return False
+            if not field.concrete or field.many_to_many:
+                return False
+        return True
+
+    def get_field_names(self, model):
+        return [
+            field.field_name for field in model.get_search_fields()
+            if isinstance(field, index.SearchField)
+            and field.field_name != 'title'
+        ]
+
+    def chunks(self, model, chunk_size):
+        '''
+        Yields lists of up to chunk_size (pk, title, [field values]) tuples,
+        reading only the searchable columns and never building StreamField
+        blocks.
+        '''
+        queryset = model.get_indexed_objects().order_by('pk').values_list(
+            'pk', 'title', *self.get_field_names(model)
+        )
+        chunk = []
+        for pk, title, *values in queryset.iterator(chunk_size=chunk_size):
+            chunk.append((pk, title, [
+                [(block['type'], block['value']) for block in value.raw_data]
+                if hasattr(value, 'raw_data') else value
+                for value in values
+            ]))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def reindex_model(self, search_index, model, chunk_size, executor, max_pending):
+        content_type = get_model_root(model)._meta.label_lower
+        total = model.get_indexed_objects().count()
+        started = time.monotonic()
+        done = 0
+        indexed = set()
+
+        def write(rows):
+            nonlocal done
+            with transaction.atomic():
+                search_index.add_rows(content_type, rows)
+            indexed.update(row[0] for row in rows)
+            done += len(rows)
+            self.report(model, done, total, started)
+
+        if executor is None:
+            for chunk in self.chunks(model, chunk_size):
+                write(extract_rows(chunk))
+        else:
+            # Keep a bounded number of chunks in flight so that memory use
+            # does not grow with the number of pages.
+            pending = []
+            for chunk in self.chunks(model, chunk_size):
+                pending.append(executor.submit(extract_rows, chunk))
+                if len(pending) >= max_pending:
+                    write(pending.pop(0).result())
+            for future in pending:
+                write(future.result())
+
+        self.stdout.write('')
+        return indexed
+
+    def reindex_objects(self, backend, model, chunk_size):
+        '''
+        Indexes full page objects through the backend, for backends without
+        the FTS5 index and for models whose text is not all in columns.
+        Returns the primary keys indexed.
+        '''
+        total = model.get_indexed_objects().count()
+        started = time.monotonic()
+        done = 0
+        indexed = set()
+        chunk = []
+        for obj in model.get_indexed_objects().order_by('pk').iterator(chunk_size=chunk_size):
+            chunk.append(obj)
+            if len(chunk) == chunk_size:
+                backend.add_bulk(model, chunk)
+                indexed.update(obj.pk for obj in chunk)
+                done += len(chunk)
+                self.report(model, done, total, started)
+                chunk = []
+        if chunk:
+            backend.add_bulk(model, chunk)
+            indexed.update(obj.pk for obj in chunk)
+            done += len(chunk)
+            self.report(model, done, total, started)
+        self.stdout.write('')
+        return indexed
+
+    def report(self, model, done, total, started):
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(
+            '\r{}: {}/{} pages ({:.0f} pages/s)'.format(
+                model.__name__, done, total, rate
+            ),
+            ending=''
+        )
+        self.stdout.flush()
@@ -0,0 +1,49 @@
+# Generated by Django 3.1.8 on 2026-10-17 20:51
+
+from django.db import migrations, models
+
+
+def create_fts_table(apps, schema_editor):
+    # The FTS5 table only exists on SQLite builds that support it; elsewhere
+    # search.backends.sqlite_fts falls back to plain database search.
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        if ('ENABLE_FTS5',) not in cursor.fetchall():
+            return
+        cursor.execute(
+            "CREATE VIRTUAL TABLE search_fts USING fts5("
+            "title, body, tokenize = 'porter unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS search_fts')
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_type', models.CharField(max_length=100)),
+                ('object_id', models.IntegerField()),
+            ],
+            options={
+                'verbose_name_plural': 'index entries',
+                'unique_together': {('content_type', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
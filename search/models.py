@@ -0,0 +1,30 @@
+from django.db import models
+
+
+class IndexEntry(models.Model):
+    '''
+    An object in the full-text index of search.backends.sqlite_fts. Its text
+    lives in the search_fts FTS5 table, in the row whose rowid is the id of
+    this entry.
+    '''
+    content_type = models.CharField(max_length=100)
+    object_id = models.IntegerField()
+
+    def __str__(self):
+        return '{} {}'.format(self.content_type, self.object_id)
+
+    class Meta:
+        unique_together = [('content_type', 'object_id')]
+        verbose_name_plural = 'index entries'
+
+
+class IndexBuild(models.Model):
+    '''
+    Present once the full-text index has been built from every indexed
+    object. Until then search.backends.sqlite_fts searches the database
+    directly, as the index only holds the objects saved since it was created.
+    '''
+    finished_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return 'Index built at {}'.format(self.finished_at)
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from wagtail.core.models import Page
+from wagtail.core.signals import page_published, page_unpublished
+
+from mysite.cache import bump_version
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+@receiver(post_delete)
+def clear_search_results(sender, **kwargs):
+    '''
+    Drops all cached search results when the set of live pages changes.
+    '''
+    if issubclass(sender, Page):
+        bump_version('search-results')
@@ -0,0 +1,241 @@
+import datetime
+import io
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+
+from wagtail.core.models import Page
+from wagtail.search.backends import get_search_backend
+from wagtail.search.backends.db import MATCH_ALL, MATCH_NONE
+from wagtail.search.models import QueryDailyHits
+from wagtail.search.query import And, MatchAll, Not, Or, Phrase, PlainText
+
+from benchmarks.querycount import QueryCountTestCase
+from projects.models import ProjectIndexPage, ProjectPage
+from search import hits
+from search.backends import sqlite_fts
+from search.backends.sqlite_fts import SQLiteFTSQueryCompiler
+from search.models import IndexBuild, IndexEntry
+
+
+class SearchQueryCountTests(QueryCountTestCase):
+    def test_search(self):
+        self.assertConstantQueries('search')
+
+    def test_last_search_page(self):
+        self.assertConstantQueries('search_deep')
+
+
+class MatchExpressionTests(TestCase):
+    def get_match(self, query, **kwargs):
+        return SQLiteFTSQueryCompiler(Page.objects.all(), query, **kwargs).get_match()
+
+    def test_plain_text(self):
+        self.assertEqual(
+            self.get_match(PlainText('red fox', operator='and')),
+            (False, '"red"* AND "fox"*')
+        )
+        self.assertEqual(
+            self.get_match(PlainText('red fox', operator='or'), partial_match=False),
+            (False, '"red" OR "fox"')
+        )
+
+    def test_quotes_are_escaped(self):
+        self.assertEqual(
+            self.get_match(Phrase('say "hi"')), (False, '"say ""hi"""')
+        )
+
+    def test_no_terms(self):
+        self.assertEqual(self.get_match('  '), (False, MATCH_NONE))
+        self.assertEqual(self.get_match(Phrase(' ')), (False, MATCH_NONE))
+
+    def test_match_all(self):
+        self.assertEqual(self.get_match(MatchAll()), (False, MATCH_ALL))
+        self.assertEqual(self.get_match(Not(MatchAll())), (False, MATCH_NONE))
+        self.assertEqual(
+            self.get_match(Or([PlainText('fox'), MatchAll()])), (False, MATCH_ALL)
+        )
+        self.assertEqual(
+            self.get_match(And([PlainText('fox'), MatchAll()])), (False, '("fox"*)')
+        )
+
+    def test_not(self):
+        self.assertEqual(self.get_match(Not(PlainText('fox'))), (True, '"fox"*'))
+        self.assertEqual(
+            self.get_match(And([PlainText('red'), Not(PlainText('fox'))])),
+            (False, '(("red"*)) NOT (("fox"*))')
+        )
+        # red OR NOT fox is everything except the foxes that are not red
+        self.assertEqual(
+            self.get_match(Or([PlainText('red'), Not(PlainText('fox'))])),
+            (True, '(("fox"*)) NOT (("red"*))')
+        )
+
+    def test_fields(self):
+        self.assertEqual(
+            self.get_match(PlainText('fox'), fields=['title']),
+            (False, 'title : ("fox"*)')
+        )
+        self.assertEqual(
+            self.get_match(MatchAll(), fields=['title']), (False, MATCH_ALL)
+        )
+
+
+class SQLiteFTSSearchTests(TestCase):
+    def setUp(self):
+        root = Page.objects.get(depth=1)
+        self.pages = {}
+        for slug, title, intro in [
+            ('title-fox', 'The quick fox', 'Jumps over the dog'),
+            ('intro-fox', 'A dog', 'Chased by a fox'),
+            ('other', 'A cat', 'Sleeps all day'),
+        ]:
+            self.pages[slug] = root.add_child(instance=ProjectPage(
+                title=title, slug=slug, intro=intro,
+                date=datetime.date(2021, 1, 1), body=[],
+            ))
+        call_command('reindex_pages', stdout=io.StringIO())
+        self.queryset = Page.objects.filter(
+            pk__in=[page.pk for page in self.pages.values()]
+        )
+
+    def search(self, query, **kwargs):
+        return self.queryset.search(query, **kwargs)
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(
+            [page.slug for page in self.search('fox')], ['title-fox', 'intro-fox']
+        )
+
+    def test_queryset_filters_apply(self):
+        self.pages['title-fox'].unpublish()
+        self.assertEqual(
+            [page.slug for page in self.queryset.live().search('fox')], ['intro-fox']
+        )
+
+    def test_slicing_and_count(self):
+        results = self.search('fox OR dog OR cat', operator='or')
+        self.assertEqual(results.count(), 3)
+        self.assertEqual(len(list(results[1:])), 2)
+        self.assertEqual(results[1:2].count(), 1)
+        self.assertEqual(results[2:10].count(), 1)
+        self.assertEqual(results[5:].count(), 0)
+        self.assertEqual(
+            [page.pk for page in results[1:]], [page.pk for page in list(results)[1:]]
+        )
+
+    def test_match_all(self):
+        self.assertEqual(self.search(MatchAll()).count(), 3)
+        self.assertEqual(len(list(self.queryset.live().search(MatchAll()))), 3)
+
+    def test_not(self):
+        results = self.search(Not(PlainText('fox')))
+        self.assertEqual([page.slug for page in results], ['other'])
+        self.assertEqual(results.count(), 1)
+        results = self.search(And([PlainText('dog'), Not(PlainText('quick'))]))
+        self.assertEqual([page.slug for page in results], ['intro-fox'])
+
+    def test_no_terms(self):
+        results = Page.objects.live().search('  ')
+        self.assertEqual(list(results), [])
+        self.assertEqual(results.count(), 0)
+
+    @override_settings(
+        STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'
+    )
+    def test_admin_filter_only_search(self):
+        user = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(user)
+        response = self.client.get('/admin/pages/search/', {'q': 'live:yes'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_highlight_escapes_text(self):
+        page = self.pages['other']
+        backend = get_search_backend()
+        backend.index.add_rows(
+            'wagtailcore.page', [(page.pk, page.title, 'a <b>cat</b> & a dog')]
+        )
+        backend.highlight('cat', [page])
+        self.assertEqual(
+            page.search_snippet, 'a &lt;b&gt;<mark>cat</mark>&lt;/b&gt; &amp; a dog'
+        )
+
+    def test_unbuilt_index_is_not_used(self):
+        get_search_backend().index.reset()
+        with mock.patch.object(sqlite_fts, '_fts_available', False):
+            self.assertFalse(IndexBuild.objects.exists())
+            # The database backend only searches the fields of Page itself
+            self.assertEqual(
+                [page.slug for page in self.search('fox')], ['title-fox']
+            )
+            call_command('reindex_pages', stdout=io.StringIO())
+            self.assertTrue(sqlite_fts.fts_available())
+            self.assertEqual(
+                [page.slug for page in self.search('fox')], ['title-fox', 'intro-fox']
+            )
+
+
+class ReindexPagesTests(TestCase):
+    def test_indexes_every_page_type_and_removes_deleted_pages(self):
+        root = Page.objects.get(depth=1)
+        index_page = root.add_child(instance=ProjectIndexPage(
+            title='Garden projects', slug='garden', intro='<p>Raised beds</p>',
+        ))
+        IndexEntry.objects.create(content_type='wagtailcore.page', object_id=999999)
+
+        call_command('reindex_pages', stdout=io.StringIO())
+
+        indexed = set(
+            IndexEntry.objects.filter(content_type='wagtailcore.page')
+            .values_list('object_id', flat=True)
+        )
+        self.assertEqual(indexed, set(Page.objects.values_list('pk', flat=True)))
+        self.assertEqual(
+            list(Page.objects.live().search('garden')), [index_page.page_ptr]
+        )
+
+
+class SearchHitTests(TestCase):
+    def tearDown(self):
+        hits._pending.clear()
+        hits._failed_flushes.clear()
+
+    def get_hits(self):
+        return dict(
+            QueryDailyHits.objects.values_list('query__query_string', 'hits')
+        )
+
+    def test_flush_writes_hits(self):
+        with mock.patch.object(hits, '_ensure_flusher'):
+            hits.record_hit('Fox')
+            hits.record_hit('fox')
+            hits.record_hit('dog')
+        hits.flush_hits()
+        self.assertEqual(self.get_hits(), {'fox': 2, 'dog': 1})
+        self.assertFalse(hits._pending)
+
+    def test_unwritable_hits_are_dropped(self):
+        write_hits = hits._write_hits
+
+        def fail_on_bad(pending):
+            if any(query_string == 'bad' for _, query_string in pending):
+                raise DatabaseError('cannot store this query')
+            write_hits(pending)
+
+        with mock.patch.object(hits, '_ensure_flusher'), \
+                mock.patch.object(hits, '_write_hits', fail_on_bad), \
+                self.assertLogs('search.hits'):
+            for attempt in range(hits.MAX_FLUSH_ATTEMPTS):
+                hits.record_hit('bad')
+                hits.record_hit('fox')
+                hits.flush_hits()
+                # The good query is written even though the batch failed
+                self.assertEqual(self.get_hits(), {'fox': attempt + 1})
+
+        self.assertFalse(hits._pending)
+        self.assertFalse(hits._failed_flushes)
@@ -1,23 +1,54 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 from django.template.response import TemplateResponse
 
 from wagtail.core.models import Page
-from wagtail.search.models import Query
+from wagtail.search.backends import get_search_backend
+from wagtail.search.utils import normalise_query_string
+
+from mysite.async_views import async_view
+from mysite.cache import get_version
+from search.hits import record_hit
+
 
+def get_search_result_ids(query_string):
+    '''
+    Returns the ids of the live pages matching query_string, best match
+    first. Results are cached per normalised query until the cache times out
+    or any page is published, unpublished or deleted (see search/signals.py).
+    '''
+    query_string = normalise_query_string(query_string)
+    key = 'search:results:{}:{}'.format(
+        get_version('search-results'),
+        md5(query_string.encode()).hexdigest(),
+    )
+    result_ids = cache.get(key)
+    if result_ids is None:
+        results = Page.objects.live().search(query_string)
+        result_ids = [page.pk for page in results]
+        cache.set(
+            key, result_ids,
+            getattr(settings, 'SEARCH_RESULTS_CACHE_TIMEOUT', 300)
+        )
+    return result_ids
 
+
+@async_view
 def search(request):
     search_query = request.GET.get('query', None)
     page = request.GET.get('page', 1)
 
     # Search
     if search_query:
-        search_results = Page.objects.live().search(search_query)
-        query = Query.get(search_query)
+        search_results = get_search_result_ids(search_query)
 
         # Record hit
-        query.add_hit()
+        record_hit(search_query)
     else:
-        search_results = Page.objects.none()
+        search_results = []
 
     # Pagination
     paginator = Paginator(search_results, 10)
@@ -28,6 +59,17 @@ def search(request):
     except EmptyPage:
         search_results = paginator.page(paginator.num_pages)
 
+    # Load only the pages shown, in the order they were ranked
+    pages = Page.objects.in_bulk(search_results.object_list)
+    search_results.object_list = [
+        pages[pk] for pk in search_results.object_list if pk in pages
+    ]
+
+    # Add highlighted excerpts where the search backend provides them
+    backend = get_search_backend()
+    if search_query and hasattr(backend, 'highlight'):
+        backend.highlight(search_query, search_results.object_list)
+
     return TemplateResponse(request, 'search/search.html', {
         'search_query': search_query,
         'search_results': search_results,